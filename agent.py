@@ -1,18 +1,33 @@
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain.memory import ConversationBufferMemory
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from langchain_community.vectorstores import Chroma
 from blackboard_scraper import BlackboardScraper
+from blackboard_sync import BlackboardManifest
 from calendar_manager import CalendarManager
+from context_builder import ContextBuilder
+from conversation_memory import TokenBudgetMemory
+from document_tags import tag_document
+from evaluation_index import EvaluationIndex, extract_document_evaluations
+from embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+from ingestion import IngestionManifest, IngestionPipeline
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from query_router import QueryRouter
+from reranker import Reranker
+from response_cache import SemanticResponseCache
+from telemetry import Telemetry
+from token_counter import count_message_tokens, count_tokens
+import asyncio
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import glob
 from pathlib import Path
 import re
-from datetime import datetime
+from typing import Iterator
 
 
 logging.basicConfig(
@@ -21,79 +36,122 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class UPAgent:
-    def __init__(self, api_key: str, pdf_directory: str):
-        """Initialize UP Agent with API key and PDF directory"""
+NO_DOCUMENTS_MESSAGE = ("No hay documentos cargados en el sistema. "
+                        "Por favor, carga algunos PDFs para poder responder consultas.")
+ERROR_MESSAGE = ("Lo siento, hubo un error al procesar tu consulta. "
+                 "Por favor, intenta de nuevo.")
+TIMEOUT_MESSAGE = ("Lo siento, tu consulta está tardando demasiado. "
+                   "Por favor, intenta de nuevo en unos momentos.")
+
+class AgentCore:
+    """Process-wide resources shared by every chat session.
+
+    Holds the LLM client, the embedder and the Chroma vector store. They
+    are built once per process; sessions only add their own conversation
+    memory on top (see UPAgent).
+    """
+
+    def __init__(self, api_key: str, pdf_directory: str,
+                 ingest_workers: int = None, ingest_queue_size: int = 8,
+                 embedding_batch_size: int = 64, embedding_concurrency: int = 4,
+                 response_cache: SemanticResponseCache = None,
+                 persist_directory: str = "chroma_db", telemetry: Telemetry = None,
+                 reranker: Reranker = None):
+        """Initialize shared resources with API key and PDF directory.
+
+        ingest_workers sets the number of PDF parsing processes (defaults to
+        the CPU count) and ingest_queue_size how many parsed files may wait
+        for embedding. embedding_batch_size and embedding_concurrency control
+        how cache misses are sent to the embedding API. response_cache
+        replaces the default SemanticResponseCache (e.g. to tune its
+        threshold, TTL or size). persist_directory holds the Chroma store
+        and the local indexes and caches. telemetry collects per-stage
+        spans and metrics for every session (a fresh Telemetry by default).
+        reranker scores candidates in the "rerank" retrieval mode; the
+        default loads a local cross-encoder on first use.
+        """
         self.api_key = api_key
         self.pdf_directory = Path(pdf_directory)
+        self.persist_directory = Path(persist_directory)
+        self.ingest_workers = ingest_workers
+        self.ingest_queue_size = ingest_queue_size
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_concurrency = embedding_concurrency
+        self._ingest_lock = threading.Lock()
+        self.response_cache = response_cache or SemanticResponseCache()
+        self.telemetry = telemetry or Telemetry()
+        self.reranker = reranker or Reranker()
+        # Off-request-path work such as conversation summaries
+        self.background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-bg")
         
         # Ensure PDF directory exists
         self.pdf_directory.mkdir(exist_ok=True)
         
         # Initialize components
         self.llm = self._initialize_llm()
+        self.embeddings = self._initialize_embeddings()
+        self.lexical_index = LexicalIndex(self.persist_directory / "lexical_index.sqlite")
+        self.evaluation_index = EvaluationIndex(self.persist_directory / "evaluations.sqlite")
+        self.router = QueryRouter()
         self.vector_store = self._initialize_vector_store()
-        self.memory = self._initialize_memory()
         self.calendar = CalendarManager()
+        self._register_metrics()
 
-        self.date_parsers = [
-            ('%d/%m/%Y', r'\d{1,2}/\d{1,2}/\d{4}'),
-            ('%d de %B del %Y', r'\d{1,2} de [a-zA-Z]+ del \d{4}'),
-            ('%d de %B de %Y', r'\d{1,2} de [a-zA-Z]+ de \d{4}'),
-            ('%Y-%m-%d', r'\d{4}-\d{2}-\d{2}')
-        ]
-        self.spanish_months = {
-            'enero': 'January', 'febrero': 'February', 'marzo': 'March',
-            'abril': 'April', 'mayo': 'May', 'junio': 'June',
-            'julio': 'July', 'agosto': 'August', 'septiembre': 'September',
-            'octubre': 'October', 'noviembre': 'November', 'diciembre': 'December'
-        }
-
+    def _register_metrics(self):
+        """Expose cache and index state as gauges read at export time"""
+        def hit_ratio():
+            ratios = {(("cache", "response"),): self.response_cache.stats()["hit_rate"]}
+            if self.embeddings.query_cache is not None:
+                ratios[(("cache", "query_embedding"),)] = self.embeddings.query_cache.stats()["hit_rate"]
+            if self.reranker.hits or self.reranker.misses:
+                ratios[(("cache", "rerank"),)] = self.reranker.stats()["hit_rate"]
+            return ratios
 
+        self.telemetry.gauge("upagent_cache_hit_ratio", hit_ratio, "Hit ratio per cache")
+        self.telemetry.gauge("upagent_indexed_chunks", lambda: self.vector_store._collection.count(),
+                             "Chunks in the vector store")
+        self.telemetry.describe("upagent_stage_seconds", "Time spent per request stage")
+        self.telemetry.describe("upagent_tokens_total", "LLM tokens by kind")
+        self.telemetry.describe("upagent_retrieved_chunks_total", "Chunks placed in prompts")
+        self.telemetry.describe("upagent_cache_lookups_total", "Response cache lookups by result")
+        self.telemetry.describe("upagent_requests_total", "Requests by entry point and outcome")
+        self.telemetry.describe("upagent_routed_requests_total", "Searches by the slice they were routed to")
+        self.telemetry.describe("upagent_time_to_first_token_seconds", "Time until the first streamed token")
 
     def _initialize_llm(self):
         """Initialize the language model"""
         return ChatOpenAI(
             api_key=self.api_key,
             model_name="gpt-4-turbo-preview",
-            temperature=0.7
+            temperature=0.7,
+            stream_usage=True
         )
 
-    def _initialize_memory(self):
-        """Initialize conversation memory"""
-        return ConversationBufferMemory(
-            return_messages=True,
-            memory_key="chat_history"
+    def _initialize_embeddings(self) -> CachedEmbeddings:
+        """Initialize the cached embedding client"""
+        return CachedEmbeddings(
+            OpenAIEmbeddings(openai_api_key=self.api_key),
+            cache_path=self.persist_directory / "embedding_cache.sqlite",
+            batch_size=self.embedding_batch_size,
+            max_concurrency=self.embedding_concurrency,
+            query_cache=QueryEmbeddingCache(path=self.persist_directory / "query_cache.sqlite")
         )
 
     def _initialize_vector_store(self) -> Chroma:
         """Initialize and load the vector store"""
         try:
-            embeddings = OpenAIEmbeddings(openai_api_key=self.api_key)
-            
             # Configuración para Chroma 0.5.x
             vector_store = Chroma(
-                persist_directory="chroma_db",
-                embedding_function=embeddings,
+                persist_directory=str(self.persist_directory),
+                embedding_function=self.embeddings,
                 collection_name="up_docs",
-                # Los nuevos parámetros de Chroma 0.5
-                collection_metadata={
-                    "hnsw:space": "cosine",
-                    "hnsw:construction_policy": "best_effort"
-                }
+                # Chroma rechaza parámetros HNSW desconocidos, como el
+                # antiguo "hnsw:construction_policy"
+                collection_metadata={"hnsw:space": "cosine"}
             )
 
-            # Load PDFs only if the vector store is empty
-            collection_size = vector_store._collection.count()
-            if collection_size == 0:
-                pdf_files = list(self.pdf_directory.glob("*.pdf"))
-                if pdf_files:
-                    logger.info(f"Loading {len(pdf_files)} PDF files...")
-                    self._load_pdfs(vector_store, pdf_files)
-                else:
-                    logger.warning("No PDF files found in directory")
-            else:
-                logger.info(f"Using existing vector store with {collection_size} documents")
+            # Index only new or changed PDFs, drop chunks of removed ones
+            self._sync_pdfs(vector_store)
 
             return vector_store
 
@@ -101,120 +159,196 @@ class UPAgent:
             logger.error(f"Error initializing vector store: {e}")
             raise
 
-    def _load_pdfs(self, vector_store, pdf_files):
-        """Load PDFs into the vector store"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            is_separator_regex=False
-        )
-        
-        for pdf_path in pdf_files:
-            try:
-                logger.info(f"Processing {pdf_path.name}")
-                loader = PyPDFLoader(str(pdf_path))
-                documents = loader.load()
-                chunks = text_splitter.split_documents(documents)
-                
-                # Enhanced metadata
+    def sync_documents(self) -> tuple[list[str], list[str]]:
+        """Add new or changed PDFs to the live index in place.
+
+        Safe to call from several sessions; concurrent syncs are serialized.
+
+        Returns:
+            Tuple of (indexed file names, removed file names)
+        """
+        with self._ingest_lock:
+            return self._sync_pdfs(self.vector_store)
+
+    def _sync_pdfs(self, vector_store) -> tuple[list[str], list[str]]:
+        """Bring the vector store in line with the PDF directory.
+
+        Returns:
+            Tuple of (indexed file names, removed file names)
+        """
+        manifest = IngestionManifest(self.persist_directory)
+        pdf_files = sorted(self.pdf_directory.glob("*.pdf"))
+        if not pdf_files:
+            logger.warning("No PDF files found in directory")
+
+        changed, removed = manifest.diff(pdf_files)
+
+        # Stores built before the manifest existed hold chunks for files
+        # the manifest does not know yet, so clear by source either way
+        for name in set(removed) | {path.name for path, _ in changed}:
+            vector_store._collection.delete(where={"source": name})
+            self.lexical_index.remove_source(name)
+            self.evaluation_index.remove_source(name)
+            manifest.forget(name)
+
+        course_hints = self._course_hints()
+        self._backfill_indexes(vector_store, manifest)
+        self._backfill_tags(vector_store, manifest, course_hints)
+
+        if changed:
+            logger.info(f"Indexing {len(changed)} new or changed PDF files...")
+            self._load_pdfs(vector_store, changed, manifest, course_hints)
+        else:
+            logger.info(f"Using existing vector store with {vector_store._collection.count()} documents")
+
+        manifest.save()
+        self.router.update(manifest.tags())
+        indexed = [path.name for path, _ in changed if path.name in manifest.entries]
+
+        # Answers grounded on re-indexed or deleted files are stale
+        self.response_cache.invalidate_sources(set(removed) | {path.name for path, _ in changed})
+        return indexed, removed
+
+    def _backfill_indexes(self, vector_store, manifest):
+        """Fill the lexical and evaluation indexes for files indexed before
+        they existed, from the chunks already stored in Chroma"""
+        lexical_missing = set(manifest.entries) - self.lexical_index.sources()
+        evaluation_missing = set(manifest.entries) - self.evaluation_index.sources()
+        for name in lexical_missing | evaluation_missing:
+            chunks = self._stored_chunks(vector_store, name)
+
+            if name in lexical_missing and chunks:
+                self.lexical_index.add(chunks)
+            if name in evaluation_missing:
+                pages = {}
                 for chunk in chunks:
-                    chunk.metadata.update({
-                        "source": pdf_path.name,
-                        "file_path": str(pdf_path),
-                        "chunk_size": len(chunk.page_content),
-                        "processed_date": str(Path(pdf_path).stat().st_mtime)
-                    })
-                
-                vector_store.add_documents(chunks)
-                logger.info(f"Added {len(chunks)} chunks from {pdf_path.name}")
-                
-            except Exception as e:
-                logger.error(f"Error processing {pdf_path.name}: {e}")
+                    pages.setdefault(chunk.metadata.get("page", 0), []).append(chunk.page_content)
+                course, evaluations = extract_document_evaluations(
+                    [(page, "\n".join(texts)) for page, texts in pages.items()], name
+                )
+                self.evaluation_index.replace_source(name, course, evaluations)
+            logger.info(f"Backfilled indexes with {len(chunks)} chunks from {name}")
 
-        vector_store.persist()
-        logger.info("Vector store persisted successfully")
+    def _course_hints(self) -> dict:
+        """{file name: Blackboard course name} of the files the sync downloaded"""
+        return {
+            entry["filename"]: entry["course"]
+            for entry in BlackboardManifest(self.pdf_directory).entries.values()
+        }
 
+    def _stored_chunks(self, vector_store, name: str) -> list:
+        stored = vector_store._collection.get(where={"source": name}, include=["documents", "metadatas"])
+        chunks = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+            if metadata.get("chunk_id")
+        ]
+        chunks.sort(key=lambda chunk: int(chunk.metadata["chunk_id"].rsplit("-", 1)[1]))
+        return chunks
 
-    def _parse_date(self, date_str: str) -> datetime:
-        """Parse date string using multiple formats"""
-        date_str = date_str.lower()
-        
-        # Replace Spanish month names
-        for es, en in self.spanish_months.items():
-            date_str = date_str.replace(es, en)
-        
-        # Try each date format
-        for fmt, _ in self.date_parsers:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
+    def _backfill_tags(self, vector_store, manifest, course_hints: dict):
+        """Tag the chunks of files indexed before retrieval tags existed.
+
+        Only metadata is rewritten; nothing is re-embedded.
+        """
+        for name, entry in manifest.entries.items():
+            if "tags" in entry:
                 continue
-        raise ValueError(f"Unable to parse date: {date_str}")
-    
+            chunks = self._stored_chunks(vector_store, name)
+            pages = sorted({chunk.metadata.get("page", 0) for chunk in chunks})[:2]
+            header = "\n".join(
+                chunk.page_content for chunk in chunks if chunk.metadata.get("page", 0) in pages
+            )
+            tags = tag_document(name, header, course_hints.get(name))
+            for chunk in chunks:
+                chunk.metadata.update(tags)
+            if chunks:
+                vector_store._collection.update(
+                    ids=[chunk.metadata["chunk_id"] for chunk in chunks],
+                    metadatas=[chunk.metadata for chunk in chunks]
+                )
+                self.lexical_index.add(chunks)
+            entry["tags"] = tags
+            logger.info(f"Tagged {len(chunks)} chunks of {name} as {tags['doc_type']}")
+
+    def _load_pdfs(self, vector_store, pdf_files, manifest, course_hints: dict = None):
+        """Load PDFs into the vector store and record them in the manifest"""
+        pipeline = IngestionPipeline(
+            vector_store,
+            workers=self.ingest_workers,
+            queue_size=self.ingest_queue_size,
+            lexical_index=self.lexical_index,
+            evaluation_index=self.evaluation_index,
+            course_hints=course_hints
+        )
+        added = pipeline.run(pdf_files, manifest)
+
+        vector_store.persist()
+        logger.info(f"Vector store persisted successfully ({added} chunks added)")
+
+
+class UPAgent:
+    def __init__(self, api_key: str = None, pdf_directory: str = "pdfs",
+                 core: AgentCore = None, memory_mode: str = "window",
+                 memory_max_turns: int = 6, memory_max_tokens: int = 2000,
+                 request_timeout: float = 60.0, retrieval_mode: str = "hybrid",
+                 retrieval_k: int = 3, candidate_k: int = 8, rerank_candidates: int = 30,
+                 context_token_budget: int = 1500, routing: bool = True, **core_options):
+        """Initialize a UP Agent session.
+
+        Pass a shared AgentCore to reuse its LLM, embedder and vector store;
+        otherwise one is built from api_key, pdf_directory and core_options.
+        Only the conversation memory belongs to the session.
+
+        memory_mode "window" keeps the last memory_max_turns exchanges within
+        memory_max_tokens and summarizes older ones; "buffer" keeps the
+        whole conversation verbatim. request_timeout bounds each
+        aprocess_message call, in seconds.
+
+        retrieval_mode "hybrid" fuses the candidate_k best vector and BM25
+        matches and keeps retrieval_k chunks for the prompt; "vector" uses
+        dense search alone. "rerank" fetches rerank_candidates from each
+        index instead and keeps the retrieval_k fused candidates the core's
+        reranker scores highest. The chunks are merged and deduplicated into at
+        most context_token_budget tokens of context (None for no limit).
+        With routing, questions naming a course or about university-wide
+        rules only search the matching documents (see QueryRouter).
+        """
+        if memory_mode not in ("window", "buffer"):
+            raise ValueError(f"Unknown memory mode: {memory_mode}")
+        if retrieval_mode not in ("hybrid", "vector", "rerank"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+        self.retrieval_mode = retrieval_mode
+        self.retrieval_k = retrieval_k
+        self.candidate_k = rerank_candidates if retrieval_mode == "rerank" else candidate_k
+        self.context_builder = ContextBuilder(max_tokens=context_token_budget)
+        self.routing = routing
+        self.memory_mode = memory_mode
+        self.memory_max_turns = memory_max_turns
+        self.memory_max_tokens = memory_max_tokens
+        self.request_timeout = request_timeout
+        self.core = core or AgentCore(api_key, pdf_directory, **core_options)
+        self.llm = self.core.llm
+        self.vector_store = self.core.vector_store
+        self.calendar = self.core.calendar
+        self.telemetry = self.core.telemetry
+        self.memory = self._initialize_memory()
+
+    def _initialize_memory(self) -> TokenBudgetMemory:
+        """Initialize conversation memory"""
+        if self.memory_mode == "buffer":
+            return TokenBudgetMemory()
+        return TokenBudgetMemory(
+            llm=self.llm,
+            max_turns=self.memory_max_turns,
+            max_tokens=self.memory_max_tokens,
+            executor=self.core.background
+        )
+
     def _extract_evaluation_dates_from_syllabus(self, course_name: str) -> list:
-        """Extract evaluation dates with improved pattern matching"""
+        """Look up the evaluations extracted from the course syllabus at ingestion"""
         try:
-            # Search for evaluation-related content
-            query = f"evaluación cronograma {course_name}"
-            docs = self.vector_store.similarity_search(query, k=5)
-            
-            evaluations = []
-            eval_patterns = [
-                r'(evaluación|examen|práctica|parcial|final|control|quiz|exposición|proyecto)',
-                r'(\d{1,2}%|\d{1,2} %)',  # Match percentage weights
-                r'(virtual|presencial|oral|escrito)'  # Match evaluation modalities
-            ]
-            
-            for doc in docs:
-                content = doc.page_content.lower()
-                
-                # Find evaluation sections
-                for section in re.split(r'\n{2,}', content):
-                    if any(word in section for word in ['evaluación', 'examen', 'práctica']):
-                        # Extract evaluation details
-                        eval_info = {
-                            'course': course_name,
-                            'type': '',
-                            'date': None,
-                            'weight': None,
-                            'modality': None,
-                            'source': doc.metadata.get('source', 'Unknown'),
-                            'page': doc.metadata.get('page', 'N/A')
-                        }
-                        
-                        # Extract evaluation type
-                        for type_match in re.finditer(eval_patterns[0], section, re.IGNORECASE):
-                            eval_info['type'] = type_match.group(0).capitalize()
-                            
-                            # Look for date near the evaluation type
-                            nearby_text = section[max(0, type_match.start()-100):min(len(section), type_match.end()+100)]
-                            
-                            # Search for dates
-                            for _, date_pattern in self.date_parsers:
-                                date_match = re.search(date_pattern, nearby_text)
-                                if date_match:
-                                    try:
-                                        eval_info['date'] = self._parse_date(date_match.group(0))
-                                        break
-                                    except ValueError:
-                                        continue
-                            
-                            # Extract weight
-                            weight_match = re.search(r'(\d{1,2})\s*%', nearby_text)
-                            if weight_match:
-                                eval_info['weight'] = int(weight_match.group(1))
-                            
-                            # Extract modality
-                            modality_match = re.search(eval_patterns[2], nearby_text)
-                            if modality_match:
-                                eval_info['modality'] = modality_match.group(0).capitalize()
-                        
-                        if eval_info['date']:
-                            evaluations.append(eval_info)
-            
-            return evaluations
-        
+            return self.core.evaluation_index.lookup(course_name)
         except Exception as e:
             logger.error(f"Error extracting evaluation dates: {e}")
             return []
@@ -227,38 +361,40 @@ class UPAgent:
         
         scheduled = []
         errors = []
+        events = []
         
         for eval_info in evaluations:
-            try:
-                date = eval_info['date']
-                title_parts = [
-                    f"{course_name}",
-                    f"{eval_info['type']}"
-                ]
-                if eval_info['weight']:
-                    title_parts.append(f"({eval_info['weight']}%)")
-                
-                description_parts = [
-                    f"Tipo: {eval_info['type']}",
-                    f"Modalidad: {eval_info['modality'] or 'No especificada'}",
-                    f"Peso: {eval_info['weight']}%" if eval_info['weight'] else None,
-                    f"Fuente: {eval_info['source']}, Página: {eval_info['page']}"
-                ]
-                
-                success, result = self.calendar.add_event(
-                    title=" - ".join(title_parts),
-                    description="\n".join(filter(None, description_parts)),
-                    start_time=date.replace(hour=10),  # Default to 10 AM
-                    duration_hours=2  # Default duration
-                )
-                
-                if success:
-                    scheduled.append(f"✅ {eval_info['type']} ({date.strftime('%d/%m/%Y')})")
-                else:
-                    errors.append(f"❌ {eval_info['type']}: {result}")
-                    
-            except Exception as e:
-                errors.append(f"❌ Error con {eval_info['type']}: {str(e)}")
+            date = eval_info['date']
+            title_parts = [
+                f"{course_name}",
+                f"{eval_info['type']}"
+            ]
+            if eval_info['weight']:
+                title_parts.append(f"({eval_info['weight']}%)")
+            
+            description_parts = [
+                f"Tipo: {eval_info['type']}",
+                f"Modalidad: {eval_info['modality'] or 'No especificada'}",
+                f"Peso: {eval_info['weight']}%" if eval_info['weight'] else None,
+                f"Fuente: {eval_info['source']}, Página: {eval_info['page']}"
+            ]
+            
+            events.append({
+                'title': " - ".join(title_parts),
+                'description': "\n".join(filter(None, description_parts)),
+                'start_time': date.replace(hour=10),  # Default to 10 AM
+                'duration_hours': 2,  # Default duration
+                # Same course, type and date always maps to the same event
+                'key': f"{eval_info['course']}|{eval_info['type']}|{date.date().isoformat()}"
+            })
+        
+        # One batched upsert instead of a request per evaluation
+        results = self.calendar.add_events(events)
+        for eval_info, (success, result) in zip(evaluations, results):
+            if success:
+                scheduled.append(f"✅ {eval_info['type']} ({eval_info['date'].strftime('%d/%m/%Y')})")
+            else:
+                errors.append(f"❌ {eval_info['type']}: {result}")
         
         response_parts = [f"📅 {course_name}:"]
         if scheduled:
@@ -268,63 +404,334 @@ class UPAgent:
         
         return "\n".join(response_parts)
 
+    def _is_calendar_intent(self, message: str) -> bool:
+        return "agenda" in message.lower() and ("evaluaciones" or "examenes") in message.lower()
+
+    def _handle_calendar_intent(self, message: str):
+        """Return the reply for calendar requests, or None for regular questions"""
+        if self._is_calendar_intent(message):
+            # Extraer nombre del curso
+            course_match = re.search(r'(?:para|de|del curso)\s+([^,\.]+)', message, re.IGNORECASE)
+            if course_match:
+                course_name = course_match.group(1).strip()
+                return self._schedule_course_evaluations(course_name)
+            else:
+                return "Por favor, especifica el nombre del curso del cual quieres agendar las evaluaciones."
+        return None
+
+    def _retrieve(self, message: str) -> tuple[list[float], list]:
+        """Embed the question once and search the indexes with it"""
+        where = self._route(message)
+        with self.telemetry.span("embed_query"):
+            query_vector = self.core.embeddings.embed_query(message)
+        k = self.retrieval_k if self.retrieval_mode == "vector" else self.candidate_k
+        with self.telemetry.span("vector_search", k=k, filtered=where is not None):
+            vector_docs = self.vector_store.similarity_search_by_vector(query_vector, k=k, filter=where)
+            if where and not vector_docs:
+                # Nothing indexed under this route; search everything
+                where = None
+                vector_docs = self.vector_store.similarity_search_by_vector(query_vector, k=k)
+        if self.retrieval_mode == "vector":
+            return query_vector, self._retrieved(vector_docs)
+
+        with self.telemetry.span("lexical_search", k=self.candidate_k, filtered=where is not None):
+            lexical_docs = self.core.lexical_index.search(message, k=self.candidate_k, where=where)
+        docs = self._fuse(vector_docs, lexical_docs)
+        if self.retrieval_mode == "rerank":
+            docs = self._rerank(message, docs)
+        return query_vector, docs
+
+    def _route(self, message: str):
+        """Metadata filter for the question's slice of the index, or None"""
+        if not self.routing:
+            return None
+        with self.telemetry.span("route") as span:
+            where = self.core.router.route(message)
+            span["filter"] = str(where)
+        route = ("course" if "course_key" in where else "doc_type") if where else "all"
+        self.telemetry.count("upagent_routed_requests_total", route=route)
+        return where
+
+    def _fuse(self, vector_docs: list, lexical_docs: list) -> list:
+        """Combine dense and BM25 results and keep the best retrieval_k.
+
+        In rerank mode every fused candidate is kept for _rerank.
+        """
+        with self.telemetry.span("fuse"):
+            docs = reciprocal_rank_fusion([vector_docs, lexical_docs])
+        if self.retrieval_mode == "rerank":
+            return docs
+        return self._retrieved(docs[:self.retrieval_k])
+
+    def _rerank(self, message: str, docs: list) -> list:
+        """Keep the retrieval_k candidates the reranker scores highest"""
+        with self.telemetry.span("rerank", candidates=len(docs)):
+            docs = self.core.reranker.rerank(message, docs, self.retrieval_k)
+        return self._retrieved(docs)
+
+    def _retrieved(self, docs: list) -> list:
+        self.telemetry.count("upagent_retrieved_chunks_total", len(docs))
+        return docs
+
+    def _build_messages(self, message: str, docs: list) -> list:
+        """Assemble the chat messages for a question and its retrieved context"""
+        with self.telemetry.span("build_prompt", chunks=len(docs)) as span:
+            # Merge overlapping chunks and fit them in the token budget
+            context = self.context_builder.build(docs)
+            span.update(context_tokens=context.tokens, passages=context.passages,
+                        merged=context.merged, dropped=context.dropped)
+            return self._prompt_messages(message, context.text)
+
+    def _prompt_messages(self, message: str, context: str) -> list:
+        # Create prompt. The human turn is passed as a message object so
+        # braces inside document text are not read as template variables.
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_system_prompt()),
+            MessagesPlaceholder(variable_name="chat_history"),
+            HumanMessage(content=f"Contexto del reglamento:\n{context}\n\n"
+                                 f"Pregunta del usuario: {message}\n\n"
+                                 "Responde como Agente UP, citando las fuentes específicas.")
+        ])
+
+        return prompt.invoke({
+            "chat_history": self.memory.messages
+        }).to_messages()
+
+    def _standalone(self) -> bool:
+        """Whether the prompt carries no chat history.
+
+        Only then does the answer depend on nothing but the question and
+        its chunks, so only then may it be shared through the core's
+        response cache with other questions and other sessions.
+        """
+        return not self.memory.messages
+
+    def _cached_answer(self, query_vector, docs):
+        """Look up a cached answer for the same retrieval result"""
+        if not self._standalone():
+            self.telemetry.count("upagent_cache_lookups_total", cache="response", result="skipped")
+            return None
+        chunk_ids = [doc.metadata.get("chunk_id") for doc in docs]
+        with self.telemetry.span("response_cache") as span:
+            answer = self.core.response_cache.lookup(query_vector, chunk_ids)
+            span["hit"] = answer is not None
+        self.telemetry.count("upagent_cache_lookups_total", cache="response",
+                             result="hit" if answer is not None else "miss")
+        if answer is not None:
+            logger.info("Answered from response cache")
+        return answer
+
+    def _record_usage(self, messages, answer_message) -> int:
+        """Count prompt and completion tokens, from the response or tiktoken"""
+        usage = getattr(answer_message, "usage_metadata", None) or {}
+        prompt_tokens = usage.get("input_tokens") or count_message_tokens(messages)
+        completion_tokens = usage.get("output_tokens") or count_tokens(answer_message.content)
+        self.telemetry.count("upagent_tokens_total", prompt_tokens, kind="prompt")
+        self.telemetry.count("upagent_tokens_total", completion_tokens, kind="completion")
+        return usage.get("total_tokens") or prompt_tokens + completion_tokens
+
+    def _cache_answer(self, query_vector, docs, messages, answer_message, started: float):
+        """Cache an answer with the latency and tokens it cost"""
+        tokens = self._record_usage(messages, answer_message)
+        if not self._standalone():
+            return
+        self.core.response_cache.store(
+            query_vector,
+            [doc.metadata.get("chunk_id") for doc in docs],
+            [doc.metadata.get("source") for doc in docs],
+            answer_message.content,
+            latency=time.perf_counter() - started,
+            tokens=tokens
+        )
+
+    def _remember(self, message: str, answer: str):
+        """Store a completed exchange in the conversation memory"""
+        self.memory.add_turn(message, answer)
+
+    def _outcome(self, request: dict, outcome: str):
+        """Tag the request span and count it by how it was answered"""
+        request["outcome"] = outcome
+        self.telemetry.count("upagent_requests_total", entry=request["entry"], outcome=outcome)
+
     def process_message(self, message: str) -> str:
         """Process user message and return response"""
-        try:
-            # Check for calendar-related intents
-            if "agenda" in message.lower() and ("evaluaciones" or "examenes") in message.lower():
-                # Extraer nombre del curso
-                course_match = re.search(r'(?:para|de|del curso)\s+([^,\.]+)', message, re.IGNORECASE)
-                if course_match:
-                    course_name = course_match.group(1).strip()
-                    return self._schedule_course_evaluations(course_name)
-                else:
-                    return "Por favor, especifica el nombre del curso del cual quieres agendar las evaluaciones."
-
-            # Check if we have any documents loaded
-            if not self.vector_store._collection.count():
-                return ("No hay documentos cargados en el sistema. "
-                       "Por favor, carga algunos PDFs para poder responder consultas.")
-
-            # Search relevant documents
-            docs = self.vector_store.similarity_search(message)
-            
-            # Format context with sources
-            context_parts = []
-            for doc in docs:
-                source = doc.metadata.get("source", "Documento sin especificar")
-                page = doc.metadata.get("page", "página no especificada")
-                context_parts.append(f"[Fuente: {source}, Página: {page}]\n{doc.page_content}")
-            
-            context = "\n\n".join(context_parts)
-
-            # Create prompt
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", self._get_system_prompt()),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("human", f"Contexto del reglamento:\n{context}\n\n"
-                         f"Pregunta del usuario: {message}\n\n"
-                         "Responde como Agente UP, citando las fuentes específicas.")
-            ])
-
-            # Get response
-            response = prompt.invoke({
-                "chat_history": self.memory.chat_memory.messages
-            }).to_messages()
-
-            # Get LLM response
-            llm_response = self.llm.invoke(response)
-            
-            # Update memory
-            self.memory.chat_memory.add_user_message(message)
-            self.memory.chat_memory.add_ai_message(llm_response.content)
+        with self.telemetry.trace("process_message", entry="sync") as request:
+            try:
+                # Check for calendar-related intents
+                reply = self._handle_calendar_intent(message)
+                if reply is not None:
+                    self._outcome(request, "calendar")
+                    return reply
 
-            return llm_response.content
+                # Check if we have any documents loaded
+                if not self.vector_store._collection.count():
+                    self._outcome(request, "no_documents")
+                    return NO_DOCUMENTS_MESSAGE
 
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            return ("Lo siento, hubo un error al procesar tu consulta. "
-                   "Por favor, intenta de nuevo.")
+                query_vector, docs = self._retrieve(message)
+                started = time.perf_counter()
+
+                # Repeated questions over the same chunks skip the LLM
+                cached = self._cached_answer(query_vector, docs)
+                if cached is not None:
+                    self._remember(message, cached)
+                    self._outcome(request, "cached")
+                    return cached
+
+                # Get LLM response
+                messages = self._build_messages(message, docs)
+                with self.telemetry.span("llm"):
+                    llm_response = self.llm.invoke(messages)
+                self._cache_answer(query_vector, docs, messages, llm_response, started)
+
+                # Update memory
+                self._remember(message, llm_response.content)
+                self._outcome(request, "llm")
+
+                return llm_response.content
+
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                self._outcome(request, "error")
+                return ERROR_MESSAGE
+
+    async def aprocess_message(self, message: str, timeout: float = None) -> str:
+        """Async variant of process_message.
+
+        Uses the async LLM and embedding clients so one event loop can serve
+        many students at once. The whole request is cancelled after timeout
+        seconds (request_timeout by default).
+        """
+        # The task wait_for starts copies this context, so its spans join the trace
+        with self.telemetry.trace("process_message", entry="async") as request:
+            try:
+                return await asyncio.wait_for(self._aprocess(message, request), timeout or self.request_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Request timed out after {timeout or self.request_timeout}s")
+                self._outcome(request, "timeout")
+                return TIMEOUT_MESSAGE
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                self._outcome(request, "error")
+                return ERROR_MESSAGE
+
+    async def _aspan(self, name: str, awaitable, **attributes):
+        """Await inside a span; gathered coroutines each get their own"""
+        with self.telemetry.span(name, **attributes):
+            return await awaitable
+
+    async def _aprocess(self, message: str, request: dict) -> str:
+        if self._is_calendar_intent(message):
+            # Calendar calls are blocking HTTP requests
+            reply = await asyncio.to_thread(self._handle_calendar_intent, message)
+            self._outcome(request, "calendar")
+            return reply
+
+        # Embed the question while checking that documents are loaded and
+        # running the lexical search
+        hybrid = self.retrieval_mode != "vector"
+        where = self._route(message)
+        query_vector, collection_size, lexical_docs = await asyncio.gather(
+            self._aspan("embed_query", self.core.embeddings.aembed_query(message)),
+            asyncio.to_thread(self.vector_store._collection.count),
+            self._aspan("lexical_search", asyncio.to_thread(
+                self.core.lexical_index.search, message, self.candidate_k, where
+            ), k=self.candidate_k, filtered=where is not None)
+            if hybrid else asyncio.sleep(0, result=[])
+        )
+        if not collection_size:
+            self._outcome(request, "no_documents")
+            return NO_DOCUMENTS_MESSAGE
+
+        k = self.candidate_k if hybrid else self.retrieval_k
+        vector_docs = await self._aspan(
+            "vector_search",
+            self.vector_store.asimilarity_search_by_vector(query_vector, k=k, filter=where),
+            k=k, filtered=where is not None
+        )
+        if where and not vector_docs:
+            # Nothing indexed under this route; search everything
+            vector_docs, lexical_docs = await asyncio.gather(
+                self._aspan("vector_search",
+                            self.vector_store.asimilarity_search_by_vector(query_vector, k=k),
+                            k=k, filtered=False),
+                asyncio.to_thread(self.core.lexical_index.search, message, self.candidate_k)
+                if hybrid else asyncio.sleep(0, result=[])
+            )
+
+        if hybrid:
+            docs = self._fuse(vector_docs, lexical_docs)
+            if self.retrieval_mode == "rerank":
+                # Cross-encoder inference is CPU-bound
+                docs = await asyncio.to_thread(self._rerank, message, docs)
+        else:
+            docs = self._retrieved(vector_docs)
+        started = time.perf_counter()
+
+        cached = self._cached_answer(query_vector, docs)
+        if cached is not None:
+            self._remember(message, cached)
+            self._outcome(request, "cached")
+            return cached
+
+        messages = self._build_messages(message, docs)
+        llm_response = await self._aspan("llm", self.llm.ainvoke(messages))
+        self._cache_answer(query_vector, docs, messages, llm_response, started)
+        self._remember(message, llm_response.content)
+        self._outcome(request, "llm")
+        return llm_response.content
+
+    def stream_message(self, message: str) -> Iterator[str]:
+        """Process user message and yield the response as tokens arrive.
+
+        The conversation memory is updated with the full answer once the
+        stream completes.
+        """
+        received = time.perf_counter()
+        with self.telemetry.trace("process_message", entry="stream") as request:
+            try:
+                reply = self._handle_calendar_intent(message)
+                if reply is not None:
+                    self._outcome(request, "calendar")
+                    yield reply
+                    return
+
+                if not self.vector_store._collection.count():
+                    self._outcome(request, "no_documents")
+                    yield NO_DOCUMENTS_MESSAGE
+                    return
+
+                query_vector, docs = self._retrieve(message)
+                started = time.perf_counter()
+
+                cached = self._cached_answer(query_vector, docs)
+                if cached is not None:
+                    self._remember(message, cached)
+                    self._outcome(request, "cached")
+                    yield cached
+                    return
+
+                messages = self._build_messages(message, docs)
+                full = None
+                with self.telemetry.span("llm") as span:
+                    for chunk in self.llm.stream(messages):
+                        if full is None:
+                            first_token = time.perf_counter() - received
+                            span["time_to_first_token_ms"] = first_token * 1000
+                            self.telemetry.observe("upagent_time_to_first_token_seconds", first_token)
+                        full = chunk if full is None else full + chunk
+                        if chunk.content:
+                            yield chunk.content
+
+                if full is not None:
+                    self._cache_answer(query_vector, docs, messages, full, started)
+                    self._remember(message, full.content)
+                self._outcome(request, "llm")
+
+            except Exception as e:
+                logger.error(f"Error streaming message: {e}")
+                self._outcome(request, "error")
+                yield ERROR_MESSAGE
 
     def _get_system_prompt(self):
         """Get the system prompt for the agent"""
@@ -1,9 +1,11 @@
 import streamlit as st
 import os
+import uuid
 from dotenv import load_dotenv
-from agent import UPAgent
-from calendar_manager import CalendarManager
+from agent import AgentCore, UPAgent
 from blackboard_scraper import BlackboardScraper
+from jobs import ACTIVE, CANCELLED, DONE, JobRunner
+from telemetry import JsonlExporter, Telemetry
 from pathlib import Path
 
 # Fix SQLite version issues
@@ -17,12 +19,21 @@ except ImportError:
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY") or st.secrets["OPENAI_API_KEY"]
+# Headless browser sessions used to download courses in parallel
+blackboard_workers = int(os.getenv("BLACKBOARD_WORKERS", "3"))
+# Optional Prometheus endpoint and JSON Lines trace file
+metrics_port = os.getenv("METRICS_PORT")
+telemetry_jsonl = os.getenv("TELEMETRY_JSONL")
 
 # Initialize session state for credentials
 if "bb_credentials" not in st.session_state:
     st.session_state.bb_credentials = None
 if "calendar_auth" not in st.session_state:
     st.session_state.calendar_auth = None
+# Owner of this browser session's upload jobs
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_owner = st.session_state.session_id
 
 # Page config
 st.set_page_config(
@@ -115,9 +126,54 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
+@st.cache_resource(show_spinner="Cargando documentos...")
+def get_agent_core(api_key: str) -> AgentCore:
+    """Build the LLM, embedder and vector store once per process"""
+    telemetry = Telemetry(JsonlExporter(telemetry_jsonl) if telemetry_jsonl else None)
+    if metrics_port:
+        telemetry.serve(int(metrics_port))
+    return AgentCore(api_key, "pdfs", telemetry=telemetry)
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    """Background jobs shared by every session of this process"""
+    return JobRunner(Path("chroma_db") / "jobs.sqlite")
+
+
+def blackboard_sync_job(job, core: AgentCore, credentials, workers: int, scraper=None):
+    """Sync Blackboard files, then index what changed into the shared core"""
+    if scraper is None:
+        job.progress(0.0, "Iniciando sesión en Blackboard...")
+        scraper = BlackboardScraper()
+        if not scraper.login(*credentials):
+            raise RuntimeError("Error de autenticación")
+
+    def update(course_title, done, total, files):
+        job.progress(0.9 * done / total, f"{done}/{total} cursos · {course_title} · {files} archivos")
+
+    try:
+        changes = scraper.sync_course_files(workers=workers, progress=update)
+    finally:
+        scraper.cleanup()
+
+    # The chat keeps answering from the current index while this runs
+    if changes.count:
+        job.progress(0.9, "Indexando documentos...")
+        core.sync_documents()
+    return changes._asdict()
+
+
+def index_documents_job(job, core: AgentCore):
+    job.progress(0.0, "Indexando documentos...")
+    indexed, removed = core.sync_documents()
+    return {"indexed": indexed, "removed": removed}
+
+
+# Initialize session state (only the conversation memory is per session)
+agent_core = get_agent_core(api_key)
+job_runner = get_job_runner()
 if "agent" not in st.session_state:
-    st.session_state.agent = UPAgent(api_key, "pdfs")
+    st.session_state.agent = UPAgent(core=agent_core)
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
@@ -145,7 +201,29 @@ def ensure_pdfs_directory():
 with st.sidebar:
     st.header("🔧 Opciones")
     
+    @st.fragment(run_every=2)
+    def show_job(kind: str, owner: str):
+        """Poll the latest background job of a kind without rerunning the page"""
+        job = job_runner.latest(kind, owner)
+        if job is None:
+            return
+        if job["status"] in ACTIVE:
+            st.progress(job["progress"], text=job["message"] or "En cola...")
+            if st.button("Cancelar", key=f"cancel_{job['id']}"):
+                job_runner.cancel(job["id"])
+        elif job["status"] == DONE and kind == "blackboard_sync":
+            changes = job["result"]
+            st.success(f"📚 {len(changes['added'])} nuevos, {len(changes['changed'])} actualizados, "
+                       f"{len(changes['removed'])} eliminados")
+        elif job["status"] == DONE:
+            st.success("✅ Documentos procesados")
+        elif job["status"] == CANCELLED:
+            st.info("Sincronización cancelada")
+        else:
+            st.error(f"Error: {job['error']}")
+
     # Blackboard Integration
+
     with st.expander("🎓 Blackboard"):
         if not st.session_state.bb_credentials:
             st.subheader("Conectar con Blackboard")
@@ -157,19 +235,17 @@ with st.sidebar:
                     scraper = BlackboardScraper()
                     if scraper.login(bb_user, bb_pass):
                         st.session_state.bb_credentials = (bb_user, bb_pass)
-                        st.success("✅ Conexión exitosa!")
                         
-                        # Descargar archivos automáticamente
-                        with st.spinner("Descargando archivos de cursos..."):
-                            files_downloaded = scraper.download_course_files()
-                            
-                            if files_downloaded == 0:
-                                st.warning("No hay archivos disponibles o error de descarga")
-                            else:
-                                st.success(f"📚 {files_downloaded} archivos descargados")
-            
-                            # Reinicializar el agente para incluir nuevos archivos
-                                st.session_state.agent = UPAgent(api_key, "pdfs")
+                        # Descargar archivos en segundo plano con la sesión ya iniciada
+                        active = job_runner.latest("blackboard_sync", bb_user)
+                        if active and active["status"] in ACTIVE:
+                            scraper.cleanup()
+                        else:
+                            job_runner.submit(
+                                "blackboard_sync", bb_user, blackboard_sync_job,
+                                agent_core, (bb_user, bb_pass), blackboard_workers, scraper=scraper
+                            )
+                        st.rerun()
 
                     else:
                         st.error("❌ Error de autenticación")
@@ -177,13 +253,14 @@ with st.sidebar:
                     st.error(f"Error: {str(e)}")
         else:
             st.success("✅ Conectado a Blackboard")
+            bb_owner = st.session_state.bb_credentials[0]
             if st.button("Actualizar archivos"):
-                with st.spinner("Actualizando archivos..."):
-                    scraper = BlackboardScraper()
-                    scraper.login(*st.session_state.bb_credentials)
-                    files_updated = scraper.download_course_files()
-                    st.success(f"📚 {files_updated} archivos actualizados")
-                    st.session_state.agent = UPAgent(api_key, "pdfs")
+                # One sync per user; a second click just shows the running one
+                job_runner.submit(
+                    "blackboard_sync", bb_owner, blackboard_sync_job,
+                    agent_core, st.session_state.bb_credentials, blackboard_workers
+                )
+            show_job("blackboard_sync", bb_owner)
             
             if st.button("Desconectar"):
                 st.session_state.bb_credentials = None
@@ -196,8 +273,8 @@ with st.sidebar:
             
             if st.button("Autorizar Calendar"):
                 try:
-                    calendar = CalendarManager().authenticate()
-                    if calendar:
+                    # Reuse the shared manager so its service stays cached
+                    if agent_core.calendar.authenticate():
                         st.session_state.calendar_auth = True
                         st.success("✅ Calendario conectado!")
                     else:
@@ -220,13 +297,37 @@ with st.sidebar:
         )
         
         if uploaded_files:
-            with st.spinner("Procesando documentos..."):
+            uploaded_names = sorted(file.name for file in uploaded_files)
+            # The uploader keeps its files across reruns; index each set once
+            if st.session_state.get("uploaded_names") != uploaded_names:
                 Path("pdfs").mkdir(exist_ok=True)
                 for file in uploaded_files:
                     with open(f"pdfs/{file.name}", "wb") as f:
                         f.write(file.getvalue())
-                st.session_state.agent = UPAgent(api_key, "pdfs")
-                st.success("✅ Documentos procesados")
+                st.session_state.uploaded_names = uploaded_names
+                # A running sync may have listed pdfs/ before these files were written
+                job_runner.submit("ingest", session_owner, index_documents_job, agent_core,
+                                  rerun_if_running=True)
+            show_job("ingest", session_owner)
+
+    # Response cache statistics
+    with st.expander("📈 Rendimiento"):
+        cache_stats = agent_core.response_cache.stats()
+        st.metric("Aciertos de caché", f"{cache_stats['hit_rate']:.0%}",
+                  help=f"{cache_stats['hits']} de {cache_stats['hits'] + cache_stats['misses']} consultas")
+        st.metric("Tiempo ahorrado", f"{cache_stats['saved_seconds']:.1f} s")
+        st.metric("Tokens ahorrados", cache_stats['saved_tokens'])
+        query_stats = agent_core.embeddings.query_cache.stats()
+        st.metric("Consultas sin re-embeber", f"{query_stats['hit_rate']:.0%}",
+                  help=f"{query_stats['hits']} de {query_stats['hits'] + query_stats['misses']} consultas")
+        stages = agent_core.telemetry.summary()
+        if stages:
+            st.caption("Tiempo medio por etapa")
+            st.dataframe(
+                [{"Etapa": stage, "Llamadas": values["count"], "Media (ms)": round(values["mean_ms"], 1)}
+                 for stage, values in sorted(stages.items(), key=lambda item: -item[1]["mean_ms"])],
+                hide_index=True
+            )
 
 # Main chat interface
 st.markdown("---")
@@ -245,9 +346,7 @@ if prompt := st.chat_input("Escribe tu pregunta aquí..."):
     
     # Get and display assistant response
     with st.chat_message("assistant"):
-        with st.spinner("Pensando..."):
-            response = st.session_state.agent.process_message(prompt)
-            st.markdown(response)
+        response = st.write_stream(st.session_state.agent.stream_message(prompt))
     st.session_state.messages.append({"role": "assistant", "content": response})
 
 # Footer
@@ -0,0 +1,52 @@
+"""Micro-benchmark of syllabus date/evaluation extraction over pdfs/.
+
+Text is extracted once up front so only the parser is timed. Every document
+is scanned as if it were a syllabus, so non-syllabi are measured too.
+
+Usage:
+    python benchmarks/bench_date_extraction.py [--pdf-dir pdfs] [--repeat 50]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pypdf import PdfReader
+from date_extraction import extract_evaluations, find_dates, infer_week_one, infer_year
+
+
+def main():
+    """Print per-document extraction throughput"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", default="pdfs")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = []
+    for pdf_path in sorted(Path(args.pdf_dir).glob("*.pdf")):
+        pages = [(i, page.extract_text() or "") for i, page in enumerate(PdfReader(str(pdf_path)).pages)]
+        documents.append((pdf_path.name, pages))
+
+    print(f"{'document':<60} {'pages':>5} {'dates':>6} {'evals':>6} {'ms/doc':>8} {'docs/s':>8} {'MB/s':>7}")
+    for name, pages in documents:
+        chars = sum(len(text) for _, text in pages)
+        dates = sum(len(find_dates(text)) for _, text in pages)
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            full_text = "\n".join(text for _, text in pages)
+            evaluations = extract_evaluations(
+                pages, name, name,
+                default_year=infer_year(full_text),
+                week_one=infer_week_one(full_text)
+            )
+        elapsed = (time.perf_counter() - started) / args.repeat
+
+        print(f"{name[:60]:<60} {len(pages):>5} {dates:>6} {len(evaluations):>6} "
+              f"{elapsed * 1000:>8.2f} {1 / elapsed:>8.0f} {chars / elapsed / 1e6:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Retrieval and generation benchmark over pdfs/ with local stand-in models.
+
+HashEmbeddings and ExtractiveChatModel replace the OpenAI clients, so runs
+need no API key and are reproducible. The real PDFs are ingested once to
+measure throughput and index size; a synthetic scale-up corpus (the same
+chunks with their sentences shuffled, under new source names) then grows
+the index to measure search and end-to-end latency against corpus size.
+The reranking stage is timed on its own, with a cold and a warm score
+cache, using the cross-encoder if sentence-transformers is installed and
+the lexical scorer otherwise. Results are written as JSON so runs can be
+compared.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--pdf-dir pdfs] [--scales 1,4,16]
+        [--k 1,4,8,16] [--repeat 20] [--llm-latency 0] [--rerank-candidates 30]
+        [--modes hybrid,rerank] [--output bench_retrieval.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Configured before the imports below, whose module-level basicConfig calls
+# would otherwise log to x.log in the working directory
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from agent import AgentCore, UPAgent
+from embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+from lexical_index import reciprocal_rank_fusion
+from local_models import ExtractiveChatModel, HashEmbeddings
+from reranker import Reranker
+from response_cache import SemanticResponseCache
+
+QUERIES = [
+    "¿Cuántas veces puedo desaprobar un curso?",
+    "¿Cuál es la nota mínima aprobatoria?",
+    "¿Cuándo empiezan las clases del ciclo 2025-I?",
+    "¿Qué pasa si falto a más del 30% de las clases?",
+    "¿Cuándo es el examen parcial de Lenguaje II?",
+    "¿Cómo se calcula el promedio ponderado?",
+    "¿Cuál es la fecha límite para retirarse de un curso?",
+    "¿Qué evaluaciones tiene Economía General II?",
+    "¿Cuántos créditos puedo llevar por ciclo?",
+    "¿Cuándo son las vacaciones de medio ciclo?",
+    "¿Qué es la evaluación sustitutoria?",
+    "¿Qué bibliografía usa el curso de Lenguaje II?",
+]
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+class LocalAgentCore(AgentCore):
+    """AgentCore wired to the deterministic local models"""
+
+    def __init__(self, *args, llm_latency: float = 0.0, **kwargs):
+        self.llm_latency = llm_latency
+        super().__init__(*args, **kwargs)
+
+    def _initialize_llm(self):
+        return ExtractiveChatModel(latency=self.llm_latency)
+
+    def _initialize_embeddings(self) -> CachedEmbeddings:
+        return CachedEmbeddings(
+            HashEmbeddings(),
+            cache_path=self.persist_directory / "embedding_cache.sqlite",
+            batch_size=self.embedding_batch_size,
+            max_concurrency=self.embedding_concurrency,
+            query_cache=QueryEmbeddingCache()
+        )
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Nearest-rank p50/p95/p99 and mean of latencies, in milliseconds"""
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        "samples": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+    }
+
+
+def timed(function, arguments, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        for argument in arguments:
+            started = time.perf_counter()
+            function(argument)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def index_sizes(persist_directory: Path) -> dict:
+    """Bytes on disk per index component"""
+    sizes = {}
+    for path in persist_directory.iterdir():
+        files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file()]
+        # Chroma keeps its HNSW segments in UUID-named folders
+        name = "chroma" if path.is_dir() or path.name.startswith("chroma") else path.stem
+        sizes[name] = sizes.get(name, 0) + sum(p.stat().st_size for p in files)
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def synthetic_chunks(base: list[Document], copy: int, rng: random.Random) -> list[Document]:
+    """A shuffled-sentence copy of the base chunks under new source names"""
+    chunks = []
+    for doc in base:
+        sentences = _SENTENCE_RE.split(doc.page_content)
+        rng.shuffle(sentences)
+        metadata = dict(
+            doc.metadata,
+            source=f"synthetic-{copy:03d}-{doc.metadata['source']}",
+            chunk_id=f"syn{copy:03d}-{doc.metadata['chunk_id']}"
+        )
+        chunks.append(Document(page_content=" ".join(sentences), metadata=metadata))
+    return chunks
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_ingestion(pdf_dir: Path, work: Path, args) -> tuple[LocalAgentCore, dict]:
+    pdf_copy = work / "pdfs"
+    shutil.copytree(pdf_dir, pdf_copy)
+    pdf_files = sorted(pdf_copy.glob("*.pdf"))
+    pages = sum(len(PdfReader(str(path)).pages) for path in pdf_files)
+
+    started = time.perf_counter()
+    core = LocalAgentCore(
+        None, str(pdf_copy), persist_directory=str(work / "chroma_db"),
+        ingest_workers=args.workers, llm_latency=args.llm_latency
+    )
+    elapsed = time.perf_counter() - started
+
+    chunks = core.vector_store._collection.count()
+    return core, {
+        "files": len(pdf_files),
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "pages_per_s": pages / elapsed,
+        "chunks_per_s": chunks / elapsed,
+    }
+
+
+def bench_search(core: LocalAgentCore, chunks: int, scale: int, args) -> list[dict]:
+    results = []
+    searches = {
+        "vector": lambda k: lambda query: core.vector_store.similarity_search(query, k=k),
+        "bm25": lambda k: lambda query: core.lexical_index.search(query, k=k),
+    }
+    for backend, make_search in searches.items():
+        for k in args.k:
+            search = make_search(k)
+            timed(search, QUERIES[:2], 1)
+            stats = percentiles(timed(search, QUERIES, args.repeat))
+            results.append(dict(backend=backend, scale=scale, chunks=chunks, k=k, **stats))
+            print(f"  {backend:<7} k={k:<3} p50={stats['p50_ms']:7.2f}ms "
+                  f"p95={stats['p95_ms']:7.2f}ms p99={stats['p99_ms']:7.2f}ms")
+    return results
+
+
+def bench_rerank(core: LocalAgentCore, chunks: int, scale: int, args) -> dict:
+    """Reranker latency over the fused candidates of each query"""
+    candidates = {}
+    for query in QUERIES:
+        vector_docs = core.vector_store.similarity_search(query, k=args.rerank_candidates)
+        lexical_docs = core.lexical_index.search(query, k=args.rerank_candidates)
+        candidates[query] = reciprocal_rank_fusion([vector_docs, lexical_docs])
+
+    # A fresh score cache per pass so every call scores all its candidates
+    scorer = core.reranker.scorer
+    samples = []
+    for _ in range(args.repeat):
+        reranker = Reranker(scorer=scorer, batch_size=core.reranker.batch_size)
+        samples.extend(timed(lambda query: reranker.rerank(query, candidates[query]), QUERIES, 1))
+    cold = percentiles(samples)
+    warm = percentiles(timed(lambda query: reranker.rerank(query, candidates[query]), QUERIES, args.repeat))
+
+    sizes = [len(docs) for docs in candidates.values()]
+    print(f"  rerank  {scorer.name} ({sum(sizes) / len(sizes):.0f} candidates) "
+          f"cold p50={cold['p50_ms']:7.2f}ms cached p50={warm['p50_ms']:7.2f}ms")
+    return {
+        "scale": scale, "chunks": chunks, "scorer": scorer.name,
+        "candidates_mean": sum(sizes) / len(sizes), "cold": cold, "cached": warm
+    }
+
+
+def bench_end_to_end(core: LocalAgentCore, chunks: int, scale: int, mode: str, args) -> dict:
+    agent = UPAgent(core=core, memory_mode="buffer", retrieval_mode=mode,
+                    rerank_candidates=args.rerank_candidates)
+    shared_cache = core.response_cache
+
+    def ask(query):
+        agent.memory.clear()
+        return agent.process_message(query)
+
+    # max_entries=0 evicts every answer as soon as it is stored
+    core.response_cache = SemanticResponseCache(max_entries=0)
+    calls = core.llm.calls
+    cold = percentiles(timed(ask, QUERIES, args.repeat))
+    llm_calls = core.llm.calls - calls
+
+    core.response_cache = SemanticResponseCache()
+    timed(ask, QUERIES, 1)
+    cached = percentiles(timed(ask, QUERIES, args.repeat))
+    core.response_cache = shared_cache
+
+    print(f"  e2e     {mode:<7} cold p50={cold['p50_ms']:7.2f}ms cached p50={cached['p50_ms']:7.2f}ms")
+    return {
+        "scale": scale, "chunks": chunks, "mode": agent.retrieval_mode,
+        "llm_latency_s": args.llm_latency, "llm_calls": llm_calls,
+        "cold": cold, "cached": cached
+    }
+
+
+def main():
+    """Run every benchmark and write the JSON report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", default="pdfs")
+    parser.add_argument("--scales", default="1,4,16",
+                        help="Corpus sizes as multiples of the real corpus")
+    parser.add_argument("--k", default="1,4,8,16")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds the fake LLM sleeps per call")
+    parser.add_argument("--rerank-candidates", type=int, default=30,
+                        help="Candidates fetched from each index before reranking")
+    parser.add_argument("--modes", default="hybrid,rerank", help="Retrieval modes timed end to end")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_retrieval.json")
+    args = parser.parse_args()
+    args.k = [int(k) for k in args.k.split(",")]
+    args.modes = args.modes.split(",")
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+
+    pdf_dir = Path(args.pdf_dir).resolve()
+    output = Path(args.output).resolve()
+    work = Path(tempfile.mkdtemp(prefix="upagent-bench-"))
+    cwd = os.getcwd()
+    # Keep files the core creates in the working directory out of the repo
+    os.chdir(work)
+    try:
+        core, ingestion = bench_ingestion(pdf_dir, work, args)
+        print(f"Ingested {ingestion['pages']} pages into {ingestion['chunks']} chunks in "
+              f"{ingestion['seconds']:.2f}s ({ingestion['pages_per_s']:.1f} pages/s, "
+              f"{ingestion['chunks_per_s']:.1f} chunks/s)")
+        sizes = index_sizes(core.persist_directory)
+
+        stored = core.vector_store._collection.get(include=["documents", "metadatas"])
+        base = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        ]
+        rng = random.Random(args.seed)
+        copies = 1
+        search, rerank, end_to_end = [], [], []
+        for scale in scales:
+            while copies < scale:
+                chunks = synthetic_chunks(base, copies, rng)
+                core.vector_store.add_documents(chunks, ids=[c.metadata["chunk_id"] for c in chunks])
+                core.lexical_index.add(chunks)
+                copies += 1
+            count = core.vector_store._collection.count()
+            print(f"Scale {scale}x ({count} chunks)")
+            search.extend(bench_search(core, count, scale, args))
+            rerank.append(bench_rerank(core, count, scale, args))
+            for mode in args.modes:
+                end_to_end.append(bench_end_to_end(core, count, scale, mode, args))
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args) | {"pdf_dir": str(pdf_dir), "scales": scales, "queries": len(QUERIES)},
+            },
+            "ingestion": ingestion,
+            "index_size_bytes": sizes,
+            "search": search,
+            "rerank": rerank,
+            "end_to_end": end_to_end,
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
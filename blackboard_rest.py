@@ -0,0 +1,234 @@
+import logging
+import re
+from pathlib import Path
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+API = "/learn/api/public/v1"
+CHUNK_SIZE = 1024 * 1024
+FOLDER_HANDLER = "resource/x-bb-folder"
+# Characters Windows and macOS refuse in file names
+_UNSAFE_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def safe_filename(name: str) -> str:
+    return _UNSAFE_RE.sub("_", name).strip() or "archivo"
+
+
+class BlackboardClient:
+    """Blackboard Learn REST client reusing an authenticated browser session.
+
+    Course contents and attachments are listed through the public REST
+    endpoints and files are streamed straight to disk over a pooled
+    connection. Interrupted downloads resume from their ``.part`` file with
+    a Range request, and known ETag/Last-Modified validators turn unchanged
+    files into a 304 with no body. ``base_url`` can point at a local mock
+    server serving the same JSON and files.
+    """
+
+    def __init__(self, base_url: str, cookies: list[dict] = None, download_dir="pdfs",
+                 pool_size: int = 8, timeout: float = 30.0, max_retries: int = 3):
+        self.base_url = base_url.rstrip("/")
+        self.download_dir = Path(download_dir)
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        retry = Retry(total=max_retries, backoff_factor=0.5,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        for cookie in cookies or []:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+            )
+
+    def close(self):
+        self.session.close()
+
+    def _get_json(self, path: str, params: dict = None) -> dict:
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _paginate(self, path: str, params: dict = None):
+        """Yield every result of a paged endpoint, following paging.nextPage"""
+        while path:
+            page = self._get_json(path, params)
+            yield from page.get("results", [])
+            # nextPage already carries the query string
+            path = page.get("paging", {}).get("nextPage")
+            params = None
+
+    def courses(self) -> list[dict]:
+        """Courses the logged-in user is enrolled in, as {id, name}"""
+        user = self._get_json(f"{API}/users/me")
+        courses = []
+        for membership in self._paginate(f"{API}/users/{user['id']}/courses", {"expand": "course"}):
+            course = membership.get("course", {})
+            courses.append({
+                "id": membership["courseId"],
+                "name": course.get("name") or course.get("courseId") or membership["courseId"]
+            })
+        return courses
+
+    def contents(self, course_id: str, parent_id: str = None, folder: tuple = ()):
+        """Walk a course's content tree, yielding non-folder items with their folder path"""
+        path = f"{API}/courses/{course_id}/contents"
+        if parent_id:
+            path += f"/{parent_id}/children"
+
+        for item in self._paginate(path):
+            if item.get("contentHandler", {}).get("id") == FOLDER_HANDLER or item.get("hasChildren"):
+                yield from self.contents(course_id, item["id"], folder + (item.get("title", ""),))
+            else:
+                yield dict(item, folder=folder)
+
+    def attachments(self, course_id: str, content_id: str) -> list[dict]:
+        return list(self._paginate(f"{API}/courses/{course_id}/contents/{content_id}/attachments"))
+
+    def download(self, course_id: str, content_id: str, attachment: dict,
+                 filename: str = None, etag: str = None, last_modified: str = None) -> dict:
+        """Stream one attachment to the download directory.
+
+        Args:
+            course_id: Course the content belongs to
+            content_id: Content item holding the attachment
+            attachment: Attachment as listed by attachments()
+            filename: Target file name, defaults to the attachment's
+            etag: ETag of the copy on disk, to skip it if unchanged
+            last_modified: Last-Modified of the copy on disk
+
+        Returns:
+            Dict with path, status ("downloaded", "resumed" or "unchanged"),
+            size, etag and last_modified
+        """
+        target = self.download_dir / safe_filename(filename or attachment["fileName"])
+        partial = target.with_name(target.name + ".part")
+        url = (f"{self.base_url}{API}/courses/{course_id}/contents/{content_id}"
+               f"/attachments/{quote(attachment['id'])}/download")
+
+        headers = {}
+        if target.exists():
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        offset = partial.stat().st_size if partial.exists() else 0
+        if offset and etag:
+            # Resume only if the file has not changed since the partial copy
+            headers = {"Range": f"bytes={offset}-", "If-Range": etag}
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return {
+                    "path": target, "status": "unchanged", "size": target.stat().st_size,
+                    "etag": etag, "last_modified": last_modified
+                }
+            response.raise_for_status()
+
+            resumed = response.status_code == 206
+            with open(partial, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+            partial.replace(target)
+
+            return {
+                "path": target,
+                "status": "resumed" if resumed else "downloaded",
+                "size": target.stat().st_size,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
+
+    def download_all(self, validators: dict = None, progress=None) -> tuple[list[dict], set]:
+        """Download the attachments of every course.
+
+        Items whose ``modified`` timestamp matches the one recorded for them
+        are skipped without any request; the rest are fetched conditionally.
+
+        Args:
+            validators: Optional {(course_id, content_id, attachment_id): {etag,
+                last_modified, modified, filename}} from an earlier run
+            progress: Optional callback(course_name, done, total, files_downloaded)
+
+        Returns:
+            Tuple of (one result dict per attachment (see download()) plus
+            course, course_id, content_id, attachment_id and modified; IDs of
+            the courses that were listed completely)
+        """
+        validators = validators or {}
+        results = []
+        # Names from earlier runs stay with their attachment
+        claimed = {known["filename"] for known in validators.values() if known.get("filename")}
+        files = 0
+        complete = set()
+        courses = self.courses()
+        logger.info(f"Found {len(courses)} courses through the REST API.")
+
+        for done, course in enumerate(courses, start=1):
+            failed = False
+            try:
+                for item in self.contents(course["id"]):
+                    for attachment in self.attachments(course["id"], item["id"]):
+                        key = (course["id"], item["id"], attachment["id"])
+                        known = validators.get(key, {})
+                        filename = known.get("filename") or self._unique_name(
+                            safe_filename(attachment["fileName"]), claimed
+                        )
+                        claimed.add(filename)
+                        target = self.download_dir / filename
+                        if known.get("modified") and known["modified"] == item.get("modified") \
+                                and target.exists():
+                            result = {
+                                "path": target, "status": "unchanged", "size": target.stat().st_size,
+                                "etag": known.get("etag"), "last_modified": known.get("last_modified")
+                            }
+                        else:
+                            try:
+                                result = self.download(
+                                    course["id"], item["id"], attachment, filename,
+                                    known.get("etag"), known.get("last_modified")
+                                )
+                            except requests.RequestException as e:
+                                logger.error(f"Error downloading {filename}: {e}")
+                                failed = True
+                                continue
+
+                        if result["status"] != "unchanged":
+                            files += 1
+                        results.append(dict(
+                            result, course=course["name"], course_id=course["id"],
+                            content_id=item["id"], attachment_id=attachment["id"],
+                            modified=item.get("modified")
+                        ))
+                if not failed:
+                    complete.add(course["id"])
+            except requests.RequestException as e:
+                logger.error(f"Error listing course {course['name']}: {e}")
+            finally:
+                if progress:
+                    progress(course["name"], done, len(courses), files)
+
+        return results, complete
+
+    @staticmethod
+    def _unique_name(name: str, claimed: set) -> str:
+        """Name not used by another attachment in this run ("Silabo (1).pdf")"""
+        if name not in claimed:
+            return name
+        stem, dot, suffix = name.rpartition(".")
+        if not dot:
+            stem, suffix = name, ""
+        counter = 1
+        while True:
+            candidate = f"{stem} ({counter}){dot}{suffix}"
+            if candidate not in claimed:
+                return candidate
+            counter += 1
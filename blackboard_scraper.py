@@ -1,23 +1,38 @@
 import logging
-import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from blackboard_rest import BlackboardClient
+from blackboard_sync import BlackboardManifest, SyncChanges, dedupe_downloads, diff_snapshots, snapshot
 
 logging.basicConfig(filename="x.log", filemode='w',level=logging.INFO, format='%(name)s - %(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Chrome writes in-progress downloads under these suffixes, then renames them
+PARTIAL_SUFFIXES = (".crdownload", ".tmp", ".part")
+DOWNLOAD_TIMEOUT = 60
+CONTENT_XPATH = "//*[contains(@class, 'content-list-item')]"
+ATTACHMENT_XPATH = '//*[starts-with(@class, "makeStylesattachmentMeta")]'
+# Workers move files into the shared folder one at a time
+_collect_lock = threading.Lock()
+
 class BlackboardScraper:
-    def __init__(self):
+    def __init__(self, download_dir="pdfs", headless: bool = False):
         self.base_url = "https://aulavirtual.up.edu.pe"
-        self.download_dir = Path("pdfs")
-        self.download_dir.mkdir(exist_ok=True)
+        self.download_dir = Path(download_dir)
+        self.download_dir.mkdir(parents=True, exist_ok=True)
         self.files_downloaded = 0
         
         self.options = webdriver.ChromeOptions()
+        if headless:
+            self.options.add_argument("--headless=new")
+            self.options.add_argument("--window-size=1920,1080")
         self.options.add_experimental_option("prefs", {
             "download.default_directory": str(self.download_dir.absolute()),
             "download.prompt_for_download": False,
@@ -50,6 +65,58 @@ class BlackboardScraper:
             logger.error(f"Timeout waiting for elements: {value}")
             return []
 
+    def _wait_until_stale(self, element, timeout=10) -> bool:
+        """Wait for an element to leave the DOM, i.e. for its view to be replaced"""
+        if element is None:
+            return True
+        try:
+            WebDriverWait(self.driver, timeout).until(EC.staleness_of(element))
+            return True
+        except TimeoutException:
+            logger.warning("Timeout waiting for the previous view to be replaced")
+            return False
+
+    def _go_back(self, marker, ready=(By.XPATH, CONTENT_XPATH), timeout=10):
+        """Navigate back and wait until the previous view has rendered again.
+
+        Args:
+            marker: Element of the current view, expected to go stale
+            ready: Locator that must be present once the previous view is back
+        """
+        self.driver.back()
+        self._wait_until_stale(marker, timeout)
+        self.wait_for_elements(*ready, timeout=timeout)
+
+    def _wait_for_viewer(self, timeout=10) -> bool:
+        """Wait for a file preview (iframe) or an attachment list to appear"""
+        try:
+            WebDriverWait(self.driver, timeout).until(EC.any_of(
+                EC.presence_of_element_located((By.TAG_NAME, "iframe")),
+                EC.presence_of_element_located((By.XPATH, ATTACHMENT_XPATH))
+            ))
+            return True
+        except TimeoutException:
+            return False
+
+    def _completed_download(self, before: set):
+        """Path of a new, fully written file in the download dir, or False"""
+        new = {path.name for path in self.download_dir.iterdir()} - before
+        # Stale partial files from earlier runs (e.g. a REST resume's .part) do not count
+        if any(name.endswith(PARTIAL_SUFFIXES) for name in new):
+            return False
+        new = sorted(new)
+        return self.download_dir / new[0] if new else False
+
+    def _wait_for_download(self, before: set, timeout=DOWNLOAD_TIMEOUT):
+        """Wait until Chrome finishes writing a file that was not in ``before``"""
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.2).until(
+                lambda _: self._completed_download(before)
+            )
+        except TimeoutException:
+            logger.error("Timeout waiting for download to complete")
+            return None
+
     def login(self, username: str, password: str) -> bool:
         try:
             self.driver = webdriver.Chrome(options=self.options)
@@ -77,6 +144,7 @@ class BlackboardScraper:
             login_button.click()
             
             # Wait for login completion
+            self._wait_until_stale(login_button, timeout=20)
             return True
 
         except Exception as e:
@@ -92,14 +160,17 @@ class BlackboardScraper:
 
             self.driver.switch_to.frame(iframe)
             download_button = self.wait_for_element(
-                By.XPATH, "//button[@title='Descargar']"
+                By.XPATH, "//button[@title='Descargar']", condition=EC.element_to_be_clickable
             )
             if not download_button:
                 return False
 
+            before = {path.name for path in self.download_dir.iterdir()}
             download_button.click()
-            time.sleep(2)
-            return True
+            downloaded = self._wait_for_download(before)
+            if downloaded:
+                logger.info(f"Downloaded {downloaded.name}")
+            return downloaded is not None
 
         except Exception as e:
             logger.error(f"Error in _download_pdf: {e}")
@@ -109,21 +180,23 @@ class BlackboardScraper:
 
     def _try_download(self):
         try:
-            if self._download_pdf():
+            if not self._wait_for_viewer():
+                return False
+
+            if self.driver.find_elements(By.TAG_NAME, "iframe") and self._download_pdf():
                 self.files_downloaded += 1
                 return True
 
-            pdfs = self.driver.find_elements(
-            By.XPATH, '//*[starts-with(@class, "makeStylesattachmentMeta")]'
-        )
+            pdfs = self.driver.find_elements(By.XPATH, ATTACHMENT_XPATH)
             
             for pdf in pdfs:
                 try:
                     pdf.click()
-                    time.sleep(1)
                     if self._download_pdf():
                         self.files_downloaded += 1
+                    preview = self.driver.find_elements(By.TAG_NAME, "iframe")
                     pdf.click()  # Close preview
+                    self._wait_until_stale(preview[0] if preview else None)
                     
                 except Exception as e:
                     logger.error(f"Error processing PDF: {e}")
@@ -142,26 +215,28 @@ class BlackboardScraper:
             is_folder = "folder" in classes  # Adjust the identifier as needed
 
             if is_folder:
-                logger.info(f"Processing folder: {element.text}")
+                name = element.text
+                logger.info(f"Processing folder: {name}")
                 element.click()
-                time.sleep(1)
+                self._wait_until_stale(element)
 
                 self._process_folder_contents()
-                logger.info(f"Processed folder: {element.text}")
+                logger.info(f"Processed folder: {name}")
 
                 # Navigate back after processing the folder
-                self.driver.back()
-                time.sleep(1)
+                items = self.driver.find_elements(By.XPATH, CONTENT_XPATH)
+                self._go_back(items[0] if items else None)
             else:
-                logger.info(f"Processing file: {element.text}")
+                name = element.text
+                logger.info(f"Processing file: {name}")
                 element.click()
-                time.sleep(1)
                 if self._try_download():
-                    logger.info(f"Successfully downloaded file: {element.text}")
+                    logger.info(f"Successfully downloaded file: {name}")
                 else:
-                    logger.warning(f"No downloadable content found for file: {element.text}")
-                self.driver.back()
-                time.sleep(1)
+                    logger.warning(f"No downloadable content found for file: {name}")
+                viewer = (self.driver.find_elements(By.TAG_NAME, "iframe")
+                          or self.driver.find_elements(By.XPATH, ATTACHMENT_XPATH))
+                self._go_back(viewer[0] if viewer else None)
 
         except StaleElementReferenceException as e:
             logger.error(f"StaleElementReferenceException in _process_content: {e}")
@@ -191,8 +266,7 @@ class BlackboardScraper:
                     self._process_content(updated_contents[index])
                 except StaleElementReferenceException:
                     logger.warning("Stale element encountered. Retrying...")
-                    time.sleep(1)
-                    updated_contents = self.driver.find_elements(
+                    updated_contents = self.wait_for_elements(
                         By.XPATH, "//*[starts-with(@class, 'content-list-item')]"
                     )
                     if index < len(updated_contents):
@@ -207,21 +281,70 @@ class BlackboardScraper:
             logger.error(f"Error in _process_folder_contents: {e}")
 
 
-    def download_course_files(self) -> int:
-        try:
-            self.driver.get(f"{self.base_url}/ultra/course")
-            logger.info("Navigated to courses page.")
-            time.sleep(2)
+    def _open_courses_page(self) -> list:
+        """Load the course list and return its course cards"""
+        self.driver.get(f"{self.base_url}/ultra/course")
+        logger.info("Navigated to courses page.")
 
-            course_list = self.wait_for_element(By.CLASS_NAME, "course-org-list", timeout=10)
-            if not course_list:
-                logger.error("Course list not found.")
-                return self.files_downloaded
+        course_list = self.wait_for_element(By.CLASS_NAME, "course-org-list", timeout=10)
+        if not course_list:
+            logger.error("Course list not found.")
+            return []
+        return self.wait_for_elements(By.TAG_NAME, "bb-base-course-card", timeout=10)
+
+    def _process_course(self, course, course_title: str):
+        """Download every material of a course card, then return to the course list"""
+        course.click()
 
-            courses = self.wait_for_elements(By.TAG_NAME, "bb-base-course-card", timeout=10)
+        # Process materials within the course
+        materials = self.wait_for_elements(
+            By.XPATH, 
+            '//*[contains(@class, "content-list-item")]',
+            timeout=10
+        )
+        logger.info(f"Found {len(materials)} materials in course '{course_title}'.")
+
+        for j in range(len(materials)):
+            try:
+                # Re-locate fresh materials each iteration
+                updated_materials = self.driver.find_elements(
+                    By.XPATH, "//*[contains(@class, 'content-list-item')]"
+                )
+                if j >= len(updated_materials):
+                    logger.warning("Material index out of range.")
+                    break
+
+                material = updated_materials[j]
+                logger.info(f"Processing material {j+1} in course '{course_title}'.")
+                self._process_content(material)
+            except StaleElementReferenceException as e:
+                logger.error(f"StaleElementReferenceException while processing material {j+1}: {e}")
+                continue
+            except Exception as e:
+                logger.error(f"Error processing material {j+1}: {e}")
+                continue
+
+        # Navigate back to courses list
+        materials = self.driver.find_elements(By.XPATH, CONTENT_XPATH)
+        self._go_back(
+            materials[0] if materials else None,
+            ready=(By.TAG_NAME, "bb-base-course-card")
+        )
+
+    def download_course_files(self, progress=None) -> int:
+        """Download the files of every course, one course after another.
+
+        Args:
+            progress: Optional callback(course_title, done, total, files_downloaded)
+        """
+        try:
+            courses = self._open_courses_page()
+            if not courses:
+                return self.files_downloaded
             logger.info(f"Found {len(courses)} courses.")
 
             for i in range(len(courses)):
+                course_title = f"Curso {i+1}"
                 try:
                     # Re-locate fresh courses each iteration
                     updated_courses = self.driver.find_elements(By.TAG_NAME, "bb-base-course-card")
@@ -232,47 +355,15 @@ class BlackboardScraper:
                     course = updated_courses[i]
                     course_title = course.text.strip()
                     logger.info(f"Processing course {i+1}: {course_title}")
-                    course.click()
-                    time.sleep(2)
-
-                    # Process materials within the course
-                    materials = self.wait_for_elements(
-                        By.XPATH, 
-                        '//*[contains(@class, "content-list-item")]',
-                        timeout=10
-                    )
-                    logger.info(f"Found {len(materials)} materials in course '{course_title}'.")
-
-                    for j in range(len(materials)):
-                        try:
-                            # Re-locate fresh materials each iteration
-                            updated_materials = self.driver.find_elements(
-                                By.XPATH, "//*[contains(@class, 'content-list-item')]"
-                            )
-                            if j >= len(updated_materials):
-                                logger.warning("Material index out of range.")
-                                break
-
-                            material = updated_materials[j]
-                            logger.info(f"Processing material {j+1} in course '{course_title}'.")
-                            self._process_content(material)
-                        except StaleElementReferenceException as e:
-                            logger.error(f"StaleElementReferenceException while processing material {j+1}: {e}")
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error processing material {j+1}: {e}")
-                            continue
-
-                    # Navigate back to courses list
-                    self.driver.back()
-                    time.sleep(2)
+                    self._process_course(course, course_title)
 
                 except StaleElementReferenceException as e:
                     logger.error(f"StaleElementReferenceException while processing course {i+1}: {e}")
-                    continue
                 except Exception as e:
                     logger.error(f"Error processing course {i+1}: {e}")
-                    continue
+                finally:
+                    if progress:
+                        progress(course_title, i + 1, len(courses), self.files_downloaded)
 
             logger.info(f"Total files downloaded: {self.files_downloaded}")
             return self.files_downloaded
@@ -282,6 +373,195 @@ class BlackboardScraper:
             return self.files_downloaded
         finally:
             self.cleanup()
+
+    def export_cookies(self) -> list[dict]:
+        """Cookies of the logged-in session, to share it with other browsers"""
+        return self.driver.get_cookies()
+
+    def start_session(self, cookies: list[dict]) -> bool:
+        """Open a browser already authenticated with cookies from export_cookies()"""
+        try:
+            self.driver = webdriver.Chrome(options=self.options)
+            # Cookies can only be set on a page of their own domain
+            self.driver.get(self.base_url)
+            for cookie in cookies:
+                self.driver.add_cookie(cookie)
+            return True
+        except Exception as e:
+            logger.error(f"Error starting session from cookies: {e}")
+            self.cleanup()
+            return False
+
+    def download_course_files_rest(self, progress=None) -> SyncChanges:
+        """Sync every course's files over the REST API with this session.
+
+        Selenium is only used for the login; its cookies authenticate the
+        HTTP client. The sync manifest in the download directory lets
+        unchanged items be skipped. The browser is kept open if the API
+        fails, so callers can fall back to download_course_files_parallel().
+
+        Args:
+            progress: Optional callback(course_title, done, total, files_downloaded)
+
+        Returns:
+            Added, changed and removed file names
+        """
+        manifest = BlackboardManifest(self.download_dir)
+        client = BlackboardClient(self.base_url, self.export_cookies(), self.download_dir)
+        try:
+            results, complete = client.download_all(manifest.validators(), progress=progress)
+        finally:
+            client.close()
+
+        changes = manifest.apply(results, complete)
+        manifest.save()
+        self.files_downloaded += len(changes.added) + len(changes.changed)
+        logger.info(f"Sync: {len(changes.added)} added, {len(changes.changed)} changed, "
+                    f"{len(changes.removed)} removed")
+        self.cleanup()
+        return changes
+
+    def sync_course_files(self, workers: int = 3, progress=None) -> SyncChanges:
+        """Bring the download directory up to date with Blackboard.
+
+        Uses the REST API when available, otherwise the browser pool, whose
+        re-downloads ("X (1).pdf") are folded back into the original files.
+        Browser syncs cannot see deletions, so they report no removals.
+
+        Args:
+            workers: Browser sessions for the fallback
+            progress: Optional callback(course_title, done, total, files_downloaded)
+
+        Returns:
+            Added, changed and removed file names, for incremental indexing
+        """
+        try:
+            return self.download_course_files_rest(progress=progress)
+        except Exception as e:
+            logger.warning(f"REST sync unavailable, falling back to the browser: {e}")
+
+        before = snapshot(self.download_dir)
+        self.download_course_files_parallel(workers=workers, progress=progress)
+        manifest = BlackboardManifest(self.download_dir)
+        downloaded = set(snapshot(self.download_dir)) - set(before)
+        dedupe_downloads(self.download_dir, downloaded,
+                         keep={entry["filename"] for entry in manifest.entries.values()})
+        return diff_snapshots(before, snapshot(self.download_dir))
+
+    def download_course_files_parallel(self, workers: int = 3, progress=None) -> int:
+        """Download every course's files with a pool of headless browsers.
+
+        The logged-in browser only lists the courses; its cookies are handed
+        to ``workers`` headless sessions that take courses from a shared
+        queue. Each worker downloads into its own subdirectory, and finished
+        files are moved into the download directory after every course.
+
+        Args:
+            workers: Number of browser sessions
+            progress: Optional callback(course_title, done, total, files_downloaded)
+
+        Returns:
+            Total number of files downloaded
+        """
+        try:
+            courses = [course.text.strip() for course in self._open_courses_page()]
+            cookies = self.export_cookies()
+        except Exception as e:
+            logger.error(f"Error listing courses: {e}")
+            self.cleanup()
+            return self.files_downloaded
+        self.cleanup()
+
+        workers = max(1, min(workers, len(courses)))
+        logger.info(f"Found {len(courses)} courses, using {workers} workers.")
+        pending = queue.Queue()
+        for index, title in enumerate(courses):
+            pending.put((index, title))
+        finished = queue.Queue()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._course_worker, worker_id, cookies, pending, finished)
+                for worker_id in range(workers)
+            ]
+            # Progress is reported from the calling thread, so UIs can update safely
+            done = 0
+            try:
+                while done < len(courses):
+                    try:
+                        title, files = finished.get(timeout=1)
+                    except queue.Empty:
+                        if all(future.done() for future in futures):
+                            break
+                        continue
+                    done += 1
+                    self.files_downloaded += files
+                    if progress:
+                        progress(title, done, len(courses), self.files_downloaded)
+            finally:
+                # If progress raised (e.g. a cancelled job), workers stop after their current course
+                while not pending.empty():
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+
+        logger.info(f"Total files downloaded: {self.files_downloaded}")
+        return self.files_downloaded
+
+    def _course_worker(self, worker_id: int, cookies: list[dict], pending: queue.Queue,
+                       finished: queue.Queue):
+        worker = BlackboardScraper(
+            download_dir=self.download_dir / f".worker-{worker_id}", headless=True
+        )
+        worker.base_url = self.base_url
+        if not worker.start_session(cookies):
+            return
+
+        try:
+            while True:
+                try:
+                    index, title = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                before = worker.files_downloaded
+                try:
+                    courses = worker._open_courses_page()
+                    # Match by title; the index is only a fallback
+                    course = next((c for c in courses if c.text.strip() == title), None)
+                    if course is None and index < len(courses):
+                        course = courses[index]
+                    if course is None:
+                        logger.warning(f"Worker {worker_id}: course not found: {title}")
+                    else:
+                        logger.info(f"Worker {worker_id} processing course: {title}")
+                        worker._process_course(course, title)
+                except Exception as e:
+                    logger.error(f"Worker {worker_id}: error processing course {title}: {e}")
+                finally:
+                    worker.collect_downloads(self.download_dir)
+                    finished.put((title, worker.files_downloaded - before))
+        finally:
+            worker.cleanup()
+            if not any(worker.download_dir.iterdir()):
+                worker.download_dir.rmdir()
+
+    def collect_downloads(self, target_dir: Path):
+        """Move finished downloads into target_dir without overwriting other files"""
+        with _collect_lock:
+            for path in sorted(self.download_dir.iterdir()):
+                if not path.is_file() or path.name.endswith(PARTIAL_SUFFIXES):
+                    continue
+                destination = target_dir / path.name
+                if destination.exists() and destination.read_bytes() == path.read_bytes():
+                    path.unlink()
+                    continue
+                counter = 1
+                while destination.exists():
+                    destination = target_dir / f"{path.stem} ({counter}){path.suffix}"
+                    counter += 1
+                path.replace(destination)
         
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import NamedTuple
+from ingestion import file_sha256
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = ".blackboard_manifest.json"
+# Chrome names a repeated download "Silabo (1).pdf"
+_DUPLICATE_RE = re.compile(r"^(?P<stem>.+) \(\d+\)$")
+_PARTIAL_SUFFIXES = (".crdownload", ".tmp", ".part")
+
+
+class SyncChanges(NamedTuple):
+    """File names affected by a Blackboard sync"""
+    added: list
+    changed: list
+    removed: list
+
+    @property
+    def count(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+
+def _key(course_id: str, content_id: str, attachment_id: str) -> str:
+    return f"{course_id}/{content_id}/{attachment_id}"
+
+
+class BlackboardManifest:
+    """Record of the Blackboard attachments mirrored in the download folder.
+
+    Entries are keyed by course, content and attachment ID and keep the
+    file name, size, ETag/Last-Modified, the item's modified timestamp and
+    the content hash, so the next sync can skip unchanged items and tell
+    added, changed and removed files apart.
+    """
+
+    def __init__(self, download_dir):
+        self.download_dir = Path(download_dir)
+        self.path = self.download_dir / MANIFEST_FILENAME
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable Blackboard manifest {self.path}: {e}")
+            return {}
+
+    def save(self):
+        """Write the manifest atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def validators(self) -> dict:
+        """Known state per (course_id, content_id, attachment_id), for BlackboardClient"""
+        return {
+            (entry["course_id"], entry["content_id"], entry["attachment_id"]): entry
+            for entry in self.entries.values()
+        }
+
+    def apply(self, results: list[dict], complete_courses: set) -> SyncChanges:
+        """Record a sync's results and work out what changed on disk.
+
+        A new download whose content matches a file already mirrored is
+        deleted and mapped to that file. Entries of completely listed
+        courses that were not seen again are removed, along with their file.
+
+        Args:
+            results: Result dicts from BlackboardClient.download_all()
+            complete_courses: Course IDs whose contents were fully listed
+        """
+        added, changed, removed = [], [], []
+        by_hash = {entry["hash"]: entry["filename"] for entry in self.entries.values()}
+        seen = set()
+
+        for result in results:
+            key = _key(result["course_id"], result["content_id"], result["attachment_id"])
+            seen.add(key)
+            old = self.entries.get(key)
+            path = result["path"]
+            name = path.name
+
+            if result["status"] == "unchanged" and old:
+                digest = old["hash"]
+            else:
+                digest = file_sha256(path)
+                owner = by_hash.get(digest)
+                if old is None and owner and owner != name and (self.download_dir / owner).exists():
+                    logger.info(f"Dropping duplicate download {name} of {owner}")
+                    path.unlink()
+                    name = owner
+                elif old is None:
+                    added.append(name)
+                elif old["hash"] != digest:
+                    changed.append(name)
+                by_hash[digest] = name
+
+            self.entries[key] = {
+                "course": result["course"],
+                "course_id": result["course_id"],
+                "content_id": result["content_id"],
+                "attachment_id": result["attachment_id"],
+                "filename": name,
+                "size": (self.download_dir / name).stat().st_size,
+                "etag": result.get("etag"),
+                "last_modified": result.get("last_modified"),
+                "modified": result.get("modified"),
+                "hash": digest
+            }
+
+        gone = [
+            key for key, entry in self.entries.items()
+            if key not in seen and entry["course_id"] in complete_courses
+        ]
+        for key in gone:
+            name = self.entries.pop(key)["filename"]
+            if any(entry["filename"] == name for entry in self.entries.values()):
+                continue
+            path = self.download_dir / name
+            if path.exists():
+                path.unlink()
+            removed.append(name)
+
+        return SyncChanges(added, changed, removed)
+
+
+def snapshot(directory) -> dict:
+    """{file name: (size, mtime)} of the finished files in a folder"""
+    return {
+        path.name: (path.stat().st_size, path.stat().st_mtime)
+        for path in Path(directory).iterdir()
+        if path.is_file() and not path.name.startswith(".")
+        and not path.name.endswith(_PARTIAL_SUFFIXES)
+    }
+
+
+def dedupe_downloads(directory, new, keep=()) -> list[str]:
+    """Fold browser re-downloads ("X (1).pdf") back into their original file.
+
+    Only copies named in ``new`` (files that appeared during this sync) are
+    considered, so an upload that merely looks like a copy is never moved
+    over another file. Identical copies are deleted; a copy with different
+    content replaces the original, since it is the newer version. Names in
+    ``keep`` (files the manifest maps to their own attachment) are left
+    alone.
+
+    Returns:
+        Names of the original files that were replaced
+    """
+    directory = Path(directory)
+    replaced = []
+    for path in sorted(directory.iterdir(), key=lambda p: p.stat().st_mtime):
+        match = _DUPLICATE_RE.match(path.stem)
+        if path.name not in new or not path.is_file() or not match or path.name in keep:
+            continue
+        original = path.with_name(match.group("stem") + path.suffix)
+        if not original.exists():
+            continue
+        if file_sha256(original) == file_sha256(path):
+            path.unlink()
+        else:
+            os.replace(path, original)
+            replaced.append(original.name)
+    return replaced
+
+
+def diff_snapshots(before: dict, after: dict) -> SyncChanges:
+    """Changes between two snapshot() results"""
+    return SyncChanges(
+        added=sorted(name for name in after if name not in before),
+        changed=sorted(name for name in after if name in before and after[name] != before[name]),
+        removed=sorted(name for name in before if name not in after)
+    )
@@ -1,37 +1,134 @@
 import datetime
+import hashlib
 import os.path
 import logging
+import threading
+import time
+from pathlib import Path
+import google_auth_httplib2
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from calendar_store import LocalEventStore
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Google caps a batch request at 50 calls
+BATCH_LIMIT = 50
+EVENT_KEY_PROPERTY = "upagentKey"
+# Largest page events().list will return
+SYNC_PAGE_SIZE = 2500
+
+
+def event_id(key: str) -> str:
+    """Deterministic Calendar event ID for a key.
+
+    Hex digits are a subset of the base32hex alphabet Google accepts for
+    client-supplied IDs, so the same key always maps to the same event.
+    """
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# Refresh access tokens this long before they expire, not after
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+_service_cache = {}
+_service_lock = threading.Lock()
+
+
+def _needs_refresh(creds) -> bool:
+    if not creds.valid:
+        return True
+    # google-auth keeps expiry as naive UTC
+    return creds.expiry is not None and creds.expiry - REFRESH_MARGIN <= datetime.datetime.utcnow()
+
+
+def _save_token(creds, token_path: str):
+    with open(token_path, "w") as token:
+        token.write(creds.to_json())
+
+
+def _build_service(creds):
+    """Build the Calendar client from the bundled discovery document.
+
+    httplib2 connections are not thread-safe, so every request gets its
+    own authorized Http while the parsed service object is shared.
+    """
+    def build_request(http, *args, **kwargs):
+        new_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        return HttpRequest(new_http, *args, **kwargs)
+
+    return build(
+        "calendar", "v3",
+        http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()),
+        requestBuilder=build_request,
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+
+def get_calendar_service(token_path: str = "token.json",
+                         credentials_path: str = "credentials.json") -> tuple:
+    """Shared credentials and Calendar service for a token file.
+
+    token.json is read and the service built once per process; later calls
+    return the cached pair, refreshing the token first when it is about to
+    expire.
+
+    Returns:
+        Tuple of (credentials, service)
+    """
+    with _service_lock:
+        cached = _service_cache.get(token_path)
+        if cached is not None:
+            creds, service = cached
+            if not _needs_refresh(creds):
+                return cached
+            if creds.refresh_token:
+                creds.refresh(Request())
+                _save_token(creds, token_path)
+                return cached
+
+        creds = None
+        if os.path.exists(token_path):
+            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+
+        if not creds or _needs_refresh(creds):
+            if creds and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            _save_token(creds, token_path)
+
+        _service_cache[token_path] = (creds, _build_service(creds))
+        return _service_cache[token_path]
+
 
 class CalendarManager:
-    def __init__(self):
+    def __init__(self, token_path: str = "token.json", credentials_path: str = "credentials.json",
+                 store_path: str = None, sync_interval: float = 60.0, service=None):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
         self.creds = None
-        self.service = None
+        # A service passed in (e.g. a local fake) is used as is, without OAuth
+        self.service = service
+        self._own_service = service is not None
+        # One mirror per token file, i.e. per user
+        self.store = LocalEventStore(store_path or Path(token_path).with_suffix(".events.sqlite"))
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
     
     def authenticate(self) -> bool:
+        """Attach the shared, fresh credentials and service to this manager"""
+        if self._own_service:
+            return True
         try:
-            if os.path.exists("token.json"):
-                self.creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-            
-            if not self.creds or not self.creds.valid:
-                if self.creds and self.creds.expired and self.creds.refresh_token:
-                    self.creds.refresh(Request())
-                else:
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        "credentials.json", SCOPES
-                    )
-                    self.creds = flow.run_local_server(port=0)
-                
-                with open("token.json", "w") as token:
-                    token.write(self.creds.to_json())
-            
-            self.service = build("calendar", "v3", credentials=self.creds)
+            self.creds, self.service = get_calendar_service(self.token_path, self.credentials_path)
             return True
             
         except Exception as e:
@@ -51,34 +148,14 @@ class CalendarManager:
         Returns:
             Tuple of (success: bool, result: str)
         """
-        if not self.creds:
-            if not self.authenticate():
-                return False, "Authentication failed"
+        if not self.authenticate():
+            return False, "Authentication failed"
 
         try:
-            end_time = start_time + datetime.timedelta(hours=duration_hours)
-            
-            event = {
-                'summary': title,
-                'description': description,
-                'start': {
-                    'dateTime': start_time.isoformat(),
-                    'timeZone': 'America/Lima',
-                },
-                'end': {
-                    'dateTime': end_time.isoformat(),
-                    'timeZone': 'America/Lima',
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'email', 'minutes': 24 * 60},
-                        {'method': 'popup', 'minutes': 60},
-                    ],
-                },
-            }
+            event = self._event_body(title, description, start_time, duration_hours)
 
             event = self.service.events().insert(calendarId='primary', body=event).execute()
+            self._last_sync = 0.0
             return True, f"Event created: {event.get('htmlLink')}"
 
         except HttpError as e:
@@ -90,31 +167,189 @@ class CalendarManager:
             logging.error(error_message)
             return False, error_message
 
-    def get_events(self, start_date: datetime.datetime, 
-                  max_results: int = 10) -> tuple[bool, list]:
-        """Get upcoming events from calendar.
+    def _event_body(self, title: str, description: str, start_time: datetime.datetime,
+                    duration_hours: int = 2, key: str = None) -> dict:
+        end_time = start_time + datetime.timedelta(hours=duration_hours)
+
+        event = {
+            'summary': title,
+            'description': description,
+            'start': {
+                'dateTime': start_time.isoformat(),
+                'timeZone': 'America/Lima',
+            },
+            'end': {
+                'dateTime': end_time.isoformat(),
+                'timeZone': 'America/Lima',
+            },
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'email', 'minutes': 24 * 60},
+                    {'method': 'popup', 'minutes': 60},
+                ],
+            },
+        }
+        if key:
+            event['id'] = event_id(key)
+            # Re-creating a deleted event with the same ID restores it
+            event['status'] = 'confirmed'
+            event['extendedProperties'] = {'private': {EVENT_KEY_PROPERTY: key}}
+        return event
+
+    def _execute_batch(self, requests: dict) -> dict:
+        """Run {request_id: request} as Google batch calls.
+
+        Returns:
+            Dict of request_id -> (response, exception)
+        """
+        results = {}
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        items = list(requests.items())
+        for start in range(0, len(items), BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for request_id, request in items[start:start + BATCH_LIMIT]:
+                batch.add(request, request_id=request_id)
+            batch.execute()
+        return results
+
+    def add_events(self, events: list[dict]) -> list[tuple[bool, str]]:
+        """Create or update many events in as few round trips as possible.
+
+        Each event is a dict with title, description, start_time, optional
+        duration_hours and a key identifying it (e.g. course, type and date).
+        The key becomes the event ID, so re-running the same schedule
+        updates the existing events instead of duplicating them.
+
+        Args:
+            events: Events to upsert
+
+        Returns:
+            One (success: bool, result: str) tuple per event, in order
+        """
+        if not self.authenticate():
+            return [(False, "Authentication failed")] * len(events)
+
+        try:
+            bodies = {
+                str(i): self._event_body(
+                    event['title'], event['description'], event['start_time'],
+                    event.get('duration_hours', 2), event['key']
+                )
+                for i, event in enumerate(events)
+            }
+            results = self._execute_batch({
+                request_id: self.service.events().insert(calendarId='primary', body=body)
+                for request_id, body in bodies.items()
+            })
+
+            # Events created on an earlier run already own their ID
+            conflicts = [
+                request_id for request_id, (_, exception) in results.items()
+                if isinstance(exception, HttpError) and exception.resp.status == 409
+            ]
+            if conflicts:
+                results.update(self._execute_batch({
+                    request_id: self.service.events().update(
+                        calendarId='primary', eventId=bodies[request_id]['id'], body=bodies[request_id]
+                    )
+                    for request_id in conflicts
+                }))
+
+            self._last_sync = 0.0
+            outcomes = []
+            for request_id in bodies:
+                response, exception = results.get(request_id, (None, None))
+                if exception is not None:
+                    error_message = f"Calendar API error: {str(exception)}"
+                    logging.error(error_message)
+                    outcomes.append((False, error_message))
+                else:
+                    outcomes.append((True, f"Event saved: {response.get('htmlLink')}"))
+            return outcomes
+
+        except Exception as e:
+            error_message = f"Unexpected error: {str(e)}"
+            logging.error(error_message)
+            return [(False, error_message)] * len(events)
+
+    def _list_changes(self, sync_token: str = None) -> int:
+        """Page through events().list, applying each page to the store.
+
+        The new sync token is only saved with the last page, so an
+        interrupted sync is simply replayed from the previous token.
+        """
+        changes = 0
+        page_token = None
+        while True:
+            params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': SYNC_PAGE_SIZE}
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+            response = self.service.events().list(**params).execute()
+
+            items = response.get('items', [])
+            page_token = response.get('nextPageToken')
+            self.store.apply(items, None if page_token else response.get('nextSyncToken'))
+            changes += len(items)
+            if not page_token:
+                return changes
+
+    def sync_events(self) -> tuple[bool, int]:
+        """Bring the local event mirror up to date.
+
+        The first sync pages through the whole calendar; later ones only
+        fetch changes since the stored sync token. An expired token (410)
+        triggers a full resync.
+
+        Returns:
+            Tuple of (success: bool, changed events: int)
+        """
+        if not self.authenticate():
+            return False, 0
+
+        with self._sync_lock:
+            try:
+                sync_token = self.store.sync_token
+                try:
+                    changes = self._list_changes(sync_token)
+                except HttpError as e:
+                    if not sync_token or e.resp.status != 410:
+                        raise
+                    logging.info("Calendar sync token expired, running a full sync")
+                    self.store.clear()
+                    changes = self._list_changes()
+
+                self._last_sync = time.monotonic()
+                return True, changes
+
+            except Exception as e:
+                logging.error(f"Error syncing events: {e}")
+                return False, 0
+
+    def get_events(self, start_date: datetime.datetime, max_results: int = 10, *,
+                   end_date: datetime.datetime = None) -> tuple[bool, list]:
+        """Get events from the local mirror, syncing it first when stale.
         
         Args:
-            start_date: Start date to look for events
-            max_results: Maximum number of events to return
+            start_date: Start date to look for events (naive dates are UTC)
+            max_results: Maximum number of events to return (None for all)
+            end_date: Optional end of the range, exclusive
             
         Returns:
             Tuple of (success: bool, events: list)
         """
-        if not self.creds:
-            if not self.authenticate():
+        if not self._last_sync or time.monotonic() - self._last_sync >= self.sync_interval:
+            success, _ = self.sync_events()
+            if not success:
                 return False, []
 
         try:
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_date.isoformat() + 'Z',
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            return True, events_result.get('items', [])
+            return True, self.store.range(start_date, end_date, max_results)
 
         except Exception as e:
             logging.error(f"Error getting events: {e}")
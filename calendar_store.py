@@ -0,0 +1,103 @@
+import datetime
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# All-day events carry a bare date; anchor them in the calendar's zone
+DEFAULT_TIMEZONE = ZoneInfo("America/Lima")
+
+
+def to_utc(value: datetime.datetime) -> str:
+    """Sortable UTC timestamp; naive datetimes are taken as UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="seconds")
+
+
+def _event_time(boundary: dict) -> str:
+    if "dateTime" in boundary:
+        value = datetime.datetime.fromisoformat(boundary["dateTime"].replace("Z", "+00:00"))
+        if value.tzinfo is None:
+            zone = boundary.get("timeZone")
+            value = value.replace(tzinfo=ZoneInfo(zone) if zone else DEFAULT_TIMEZONE)
+        return to_utc(value)
+    day = datetime.date.fromisoformat(boundary["date"])
+    return to_utc(datetime.datetime.combine(day, datetime.time(), DEFAULT_TIMEZONE))
+
+
+class LocalEventStore:
+    """SQLite mirror of one user's Google Calendar.
+
+    Holds the events and the sync token of the last incremental sync, so
+    range queries are answered locally with an indexed scan.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS events (
+                    id TEXT PRIMARY KEY,
+                    start_utc TEXT NOT NULL,
+                    end_utc TEXT NOT NULL,
+                    body TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS events_start ON events (start_utc);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+
+    @property
+    def sync_token(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'sync_token'").fetchone()
+        return row[0] if row else None
+
+    def apply(self, items: list[dict], sync_token: str = None):
+        """Apply a page of changes; cancelled events are removed"""
+        upserts = []
+        deletes = []
+        for item in items:
+            if item.get("status") == "cancelled" or "start" not in item:
+                deletes.append((item["id"],))
+            else:
+                upserts.append((
+                    item["id"], _event_time(item["start"]), _event_time(item["end"]),
+                    json.dumps(item, ensure_ascii=False)
+                ))
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM events WHERE id = ?", deletes)
+            self._conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", upserts)
+            if sync_token:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('sync_token', ?)", (sync_token,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM events")
+            self._conn.execute("DELETE FROM meta WHERE key = 'sync_token'")
+            self._conn.commit()
+
+    def range(self, start: datetime.datetime, end: datetime.datetime = None,
+              limit: int = None) -> list[dict]:
+        """Events overlapping [start, end), ordered by start time"""
+        query = "SELECT body FROM events WHERE end_utc > ?"
+        params = [to_utc(start)]
+        if end is not None:
+            query += " AND start_utc < ?"
+            params.append(to_utc(end))
+        query += " ORDER BY start_utc"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            return [json.loads(row[0]) for row in self._conn.execute(query, params)]
@@ -0,0 +1,151 @@
+import logging
+import re
+from typing import NamedTuple
+from token_counter import DEFAULT_MODEL, count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text accepted as the overlap between two chunks
+MIN_OVERLAP = 20
+# Characters the splitter may drop between two adjacent chunks
+MAX_GAP = 2
+# A truncated passage shorter than this is not worth its header
+MIN_PASSAGE_TOKENS = 40
+_WORD_RE = re.compile(r"\w+")
+
+
+class Context(NamedTuple):
+    """Prompt context assembled from retrieved chunks"""
+    text: str
+    tokens: int
+    passages: int
+    merged: int
+    dropped: int
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that starts right"""
+    for size in range(min(len(left), len(right)), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _join(passage: dict, doc_text: str, start, end=None) -> bool:
+    """Extend a passage with an overlapping or adjacent chunk of its page.
+
+    Chunks carrying the splitter's start_index are joined by offset; older
+    chunks without it fall back to matching the shared text.
+    """
+    if start is not None and passage["start"] is not None:
+        end = end if end is not None else start + len(doc_text)
+        if start > passage["end"] + MAX_GAP or end < passage["start"] - MAX_GAP:
+            return False
+        if start < passage["start"]:
+            head = doc_text[:passage["start"] - start]
+            passage["text"] = head + ("\n" if start + len(head) < passage["start"] else "") + passage["text"]
+        if end > passage["end"]:
+            if start > passage["end"]:
+                passage["text"] += "\n" + doc_text
+            else:
+                passage["text"] += doc_text[passage["end"] - start:]
+        passage["start"] = min(passage["start"], start)
+        passage["end"] = max(passage["end"], end)
+        return True
+
+    if doc_text in passage["text"]:
+        return True
+    if passage["text"] in doc_text:
+        passage["text"] = doc_text
+        return True
+    overlap = _text_overlap(passage["text"], doc_text)
+    if overlap:
+        passage["text"] += doc_text[overlap:]
+        return True
+    overlap = _text_overlap(doc_text, passage["text"])
+    if overlap:
+        passage["text"] = doc_text + passage["text"][overlap:]
+        return True
+    return False
+
+
+class ContextBuilder:
+    """Turn ranked chunks into a prompt context within a token budget.
+
+    Overlapping or adjacent chunks of the same source page are merged into
+    one passage, so the 200-character chunk overlap is sent once. Chunks
+    whose word shingles are mostly covered by a passage already kept (the
+    same text in another file or page) are dropped. Passages are added in
+    relevance order until max_tokens is reached; the one that crosses the
+    budget is truncated if enough room is left.
+    """
+
+    def __init__(self, max_tokens: int = None, duplicate_threshold: float = 0.9,
+                 model: str = DEFAULT_MODEL):
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.model = model
+
+    def _passages(self, docs: list) -> tuple[list[dict], int, int]:
+        passages = []
+        merged = dropped = 0
+        for doc in docs:
+            key = (doc.metadata.get("source", "Documento sin especificar"),
+                   doc.metadata.get("page", "página no especificada"))
+            start = doc.metadata.get("start_index")
+            text = doc.page_content
+
+            target = next((p for p in passages if p["key"] == key and _join(p, text, start)), None)
+            if target is not None:
+                merged += 1
+                # The grown passage may now bridge another one of the page
+                for other in [p for p in passages if p is not target and p["key"] == key]:
+                    if _join(target, other["text"], other["start"], other["end"]):
+                        passages.remove(other)
+                target["shingles"] = _shingles(target["text"])
+                continue
+
+            shingles = _shingles(text)
+            if any(len(shingles & p["shingles"]) >= self.duplicate_threshold * len(shingles)
+                   for p in passages):
+                dropped += 1
+                continue
+
+            passages.append({
+                "key": key, "text": text, "shingles": shingles, "start": start,
+                "end": start + len(text) if start is not None else None
+            })
+        return passages, merged, dropped
+
+    def build(self, docs: list) -> Context:
+        """Context for docs, given most relevant first"""
+        passages, merged, dropped = self._passages(docs)
+        parts = []
+        used = 0
+        separator = count_tokens("\n\n", self.model)
+        for passage in passages:
+            source, page = passage["key"]
+            header = f"[Fuente: {source}, Página: {page}]\n"
+            part = header + passage["text"]
+            tokens = count_tokens(part, self.model) + (separator if parts else 0)
+            if self.max_tokens is not None and used + tokens > self.max_tokens:
+                room = self.max_tokens - used - count_tokens(header, self.model) - (separator if parts else 0)
+                if room >= MIN_PASSAGE_TOKENS:
+                    part = header + truncate_tokens(passage["text"], room, self.model)
+                    parts.append(part)
+                    used += count_tokens(part, self.model) + (separator if len(parts) > 1 else 0)
+                dropped += len(passages) - len(parts)
+                break
+            parts.append(part)
+            used += tokens
+
+        if dropped:
+            logger.debug(f"Context: {len(parts)} passages, {merged} chunks merged, {dropped} dropped")
+        return Context("\n\n".join(parts), used, len(parts), merged, dropped)
@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections import deque
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Resume la siguiente conversación entre un estudiante y Agente UP en un párrafo breve.
+Conserva cursos, fechas, normas y datos concretos mencionados; omite saludos.
+
+Resumen previo:
+{summary}
+
+Nuevos turnos:
+{turns}"""
+
+
+class TokenBudgetMemory:
+    """Conversation memory with a bounded prompt footprint.
+
+    The last ``max_turns`` exchanges are kept verbatim as long as they fit in
+    ``max_tokens``. Older exchanges are folded into a rolling summary by the
+    LLM on a background executor, so the request path never waits for it.
+    With no limits set it behaves like a plain conversation buffer.
+    """
+
+    def __init__(self, llm=None, max_turns: int = None, max_tokens: int = None,
+                 executor=None):
+        self.llm = llm
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.executor = executor
+        self.summary = ""
+        self._turns = deque()
+        self._pending = []
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self) -> list:
+        """Messages to send as chat history: summary first, then recent turns"""
+        with self._lock:
+            history = []
+            if self.summary:
+                history.append(SystemMessage(content=f"Resumen de la conversación previa: {self.summary}"))
+            for user_message, ai_message, _ in self._turns:
+                history.extend([user_message, ai_message])
+            return history
+
+    def add_turn(self, user_text: str, ai_text: str):
+        """Store a completed exchange and evict what exceeds the budget"""
+        tokens = count_tokens(user_text) + count_tokens(ai_text)
+        with self._lock:
+            self._turns.append((HumanMessage(content=user_text), AIMessage(content=ai_text), tokens))
+            evicted = self._evict()
+            if evicted:
+                self._pending.extend(evicted)
+                schedule = not self._summarizing and self.llm is not None
+                self._summarizing = self._summarizing or schedule
+            else:
+                schedule = False
+
+        if schedule:
+            if self.executor is not None:
+                self.executor.submit(self._summarize)
+            else:
+                self._summarize()
+
+    def _evict(self) -> list:
+        evicted = []
+        # Always keep the latest turn, even if it alone exceeds the budget
+        while len(self._turns) > 1 and (
+            (self.max_turns is not None and len(self._turns) > self.max_turns)
+            or (self.max_tokens is not None
+                and sum(turn[2] for turn in self._turns) > self.max_tokens)
+        ):
+            evicted.append(self._turns.popleft())
+        return evicted
+
+    def _summarize(self):
+        """Fold evicted turns into the summary until none are left"""
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+
+            turns = "\n".join(
+                f"Estudiante: {user_message.content}\nAgente UP: {ai_message.content}"
+                for user_message, ai_message, _ in batch
+            )
+            try:
+                result = self.llm.invoke(SUMMARY_PROMPT.format(summary=summary or "(ninguno)", turns=turns))
+            except Exception as e:
+                logger.error(f"Error summarizing conversation: {e}")
+                with self._lock:
+                    self._summarizing = False
+                return
+
+            with self._lock:
+                self.summary = result.content.strip()
+                del self._pending[:len(batch)]
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self._turns.clear()
+            self._pending.clear()
@@ -0,0 +1,250 @@
+"""Spanish date and evaluation extraction for UP syllabi.
+
+Every pattern is compiled once at import. Dates are found in a single pass
+of one combined regex with named groups, and months are resolved through a
+dictionary lookup instead of locale-dependent ``%B`` parsing. Supported
+forms include "25/01/2025", "15/01", "2025-01-25", "lunes 14 de abril",
+"25 de enero de 2025", ranges such as "del 13/01/2025 al 18/01/2025" or
+"del 14 al 18 de abril", and week references ("semana 7").
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+MONTHS = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10,
+    'noviembre': 11, 'diciembre': 12
+}
+
+_MONTH = "|".join(MONTHS)
+_WEEKDAY = r"(?:lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo)"
+_YEAR = r"\d{4}|\d{2}"
+
+# The leading lookahead lets the engine skip most positions cheaply: every
+# alternative starts with a digit or "semana"
+DATE_RE = re.compile(
+    rf"""
+    (?=\d|semana)
+    (?:
+    (?P<range>
+        \b(?P<r_day1>\d{{1,2}})(?:/(?P<r_month1>\d{{1,2}})(?:/(?P<r_year1>{_YEAR}))?|\s*de\s+(?P<r_mname1>{_MONTH}))?
+        \s+(?:al?|hasta(?:\s+el)?)\s+(?:{_WEEKDAY}\s+)?
+        (?P<r_day2>\d{{1,2}})(?:/(?P<r_month2>\d{{1,2}})(?:/(?P<r_year2>{_YEAR}))?|\s*de\s+(?P<r_mname2>{_MONTH})(?:\s+del?\s+(?P<r_tyear2>\d{{4}}))?)
+    )
+    | (?P<iso>\b(?P<i_year>\d{{4}})-(?P<i_month>\d{{2}})-(?P<i_day>\d{{2}})\b)
+    | (?P<text>
+        \b(?P<t_day>\d{{1,2}})\s*de\s+(?P<t_month>{_MONTH})(?:\s+del?\s+(?P<t_year>\d{{4}}))?
+    )
+    | (?P<num>\b(?P<n_day>\d{{1,2}})/(?P<n_month>\d{{1,2}})(?:/(?P<n_year>{_YEAR}))?(?![\d/]))
+    | (?P<week>\bsemana\s+(?P<w_number>\d{{1,2}})\b)
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+EVAL_TYPE_RE = re.compile(
+    r"(?=[efpctq])\b(?:ex[aá]men(?:\s+(?:parcial|final))?|parcial|final"
+    r"|pr[aá]ctica(?:\s+calificada)?(?!\s+dirigida)|trabajo\s+pr[aá]ctico"
+    r"|evaluaci[oó]n(?:\s+sustitutoria)?|control|quiz|exposici[oó]n|proyecto)\b",
+    re.IGNORECASE
+)
+WEIGHT_RE = re.compile(r"\b(\d{1,3})\s*%")
+MODALITY_RE = re.compile(r"\b(virtual|presencial|oral|escrito)\b", re.IGNORECASE)
+YEAR_HINT_RE = re.compile(r"\b(20\d{2})-\d{2}\b|\b(20\d{2})\b")
+FIRST_WEEK_RE = re.compile(
+    r"semana\s+1\b\D{0,20}?(?P<day>\d{1,2})/(?P<month>\d{1,2})/(?P<year>\d{4}|\d{2})",
+    re.IGNORECASE
+)
+
+EVAL_TYPES = {
+    'examen': 'Examen',
+    'examen parcial': 'Examen Parcial',
+    'parcial': 'Examen Parcial',
+    'examen final': 'Examen Final',
+    'final': 'Examen Final',
+    'practica': 'Práctica',
+    'practica calificada': 'Práctica Calificada',
+    'trabajo practico': 'Trabajo Práctico',
+    'evaluacion': 'Evaluación',
+    'evaluacion sustitutoria': 'Evaluación Sustitutoria',
+    'control': 'Control',
+    'quiz': 'Quiz',
+    'exposicion': 'Exposición',
+    'proyecto': 'Proyecto'
+}
+
+# Characters around an evaluation name searched for its date and weight
+WINDOW = 120
+
+
+class DateMention(NamedTuple):
+    start: Optional[datetime]
+    end: Optional[datetime]
+    week: Optional[int]
+    position: int
+    text: str
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return re.sub(r"\s+", " ", "".join(ch for ch in text if not unicodedata.combining(ch)))
+
+
+def _year(value, default_year):
+    if not value:
+        return default_year
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _make_date(year, month, day):
+    if year is None or not month:
+        return None
+    try:
+        return datetime(year, int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _month(number, name):
+    return int(number) if number else MONTHS.get((name or "").lower())
+
+
+def _mention(match, default_year, week_one) -> DateMention:
+    position = match.start()
+    text = match.group(0)
+    if match.group("range"):
+        month2 = _month(match.group("r_month2"), match.group("r_mname2"))
+        year2 = _year(match.group("r_year2") or match.group("r_tyear2"), default_year)
+        month1 = _month(match.group("r_month1"), match.group("r_mname1")) or month2
+        year1 = _year(match.group("r_year1"), year2)
+        return DateMention(
+            _make_date(year1, month1, match.group("r_day1")),
+            _make_date(year2, month2, match.group("r_day2")),
+            None, position, text
+        )
+    if match.group("iso"):
+        date = _make_date(int(match.group("i_year")), match.group("i_month"), match.group("i_day"))
+        return DateMention(date, date, None, position, text)
+    if match.group("text"):
+        date = _make_date(
+            _year(match.group("t_year"), default_year),
+            MONTHS[match.group("t_month").lower()],
+            match.group("t_day")
+        )
+        return DateMention(date, date, None, position, text)
+    if match.group("num"):
+        date = _make_date(
+            _year(match.group("n_year"), default_year), match.group("n_month"), match.group("n_day")
+        )
+        return DateMention(date, date, None, position, text)
+
+    week = int(match.group("w_number"))
+    date = week_one + timedelta(weeks=week - 1) if week_one else None
+    return DateMention(date, date, week, position, text)
+
+
+def find_dates(text: str, default_year: int = None, week_one: datetime = None) -> list[DateMention]:
+    """Find every date mention in a text in one regex pass.
+
+    Args:
+        text: Text to scan
+        default_year: Year for dates written without one ("15/01")
+        week_one: Start of week 1, used to turn "semana N" into a date
+
+    Returns:
+        Mentions in order of appearance; start/end are None when a mention
+        cannot be resolved to a valid date
+    """
+    return [_mention(match, default_year, week_one) for match in DATE_RE.finditer(text)]
+
+
+def parse_date(date_str: str, default_year: int = None) -> datetime:
+    """Parse a single Spanish date string"""
+    match = DATE_RE.search(date_str)
+    if match:
+        mention = _mention(match, default_year, None)
+        if mention.start is not None:
+            return mention.start
+    raise ValueError(f"Unable to parse date: {date_str}")
+
+
+def infer_year(text: str):
+    """Academic year of a document, from its term code ("2025-00") or first year"""
+    match = YEAR_HINT_RE.search(text)
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+def infer_week_one(text: str):
+    """Start date of week 1 when the schedule spells it out ("Semana 1: del 02/01/2025")"""
+    match = FIRST_WEEK_RE.search(text)
+    if not match:
+        return None
+    return _make_date(_year(match.group("year"), None), match.group("month"), match.group("day"))
+
+
+def _nearest(mentions, positions, position):
+    """Mention closest to a position, within WINDOW characters"""
+    index = bisect_left(positions, position)
+    best, best_distance = None, WINDOW + 1
+    for candidate in mentions[max(0, index - 2):index + 2]:
+        if candidate.start is None:
+            continue
+        distance = abs(candidate.position - position)
+        if distance < best_distance:
+            best, best_distance = candidate, distance
+    return best
+
+
+def extract_evaluations(pages, course: str, source: str,
+                        default_year: int = None, week_one: datetime = None) -> list[dict]:
+    """Extract dated evaluations from every page of a syllabus.
+
+    Each evaluation name is paired with the nearest resolvable date within
+    WINDOW characters, plus any weight and modality in the same window.
+
+    Args:
+        pages: (page number, page text) pairs covering the whole document
+        course: Course name the evaluations belong to
+        source: File name of the syllabus
+        default_year: Year for dates written without one
+        week_one: Start of week 1 for "semana N" references
+
+    Returns:
+        One dict per distinct (type, date) with course, type, date, weight,
+        modality, source and page, ordered by date
+    """
+    evaluations = {}
+    for page, text in pages:
+        mentions = find_dates(text, default_year, week_one)
+        positions = [mention.position for mention in mentions]
+
+        for type_match in EVAL_TYPE_RE.finditer(text):
+            mention = _nearest(mentions, positions, type_match.start())
+            if mention is None:
+                continue
+
+            eval_type = EVAL_TYPES[_fold(type_match.group(0))]
+            key = (eval_type, mention.start)
+            if key in evaluations:
+                continue
+
+            window = text[max(0, type_match.start() - WINDOW):type_match.end() + WINDOW]
+            weight_match = WEIGHT_RE.search(window)
+            modality_match = MODALITY_RE.search(window)
+            evaluations[key] = {
+                'course': course,
+                'type': eval_type,
+                'date': mention.start,
+                'weight': int(weight_match.group(1)) if weight_match else None,
+                'modality': modality_match.group(1).capitalize() if modality_match else None,
+                'source': source,
+                'page': page
+            }
+
+    return sorted(evaluations.values(), key=lambda evaluation: evaluation['date'])
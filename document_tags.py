@@ -0,0 +1,84 @@
+import re
+from pathlib import Path
+from evaluation_index import course_key, detect_course
+
+# Metadata keys every chunk carries; "" when unknown, since Chroma
+# metadata cannot hold None
+TAG_KEYS = ("doc_type", "course", "course_code", "course_key", "term")
+SYLLABUS = "syllabus"
+REGULATION = "regulation"
+CALENDAR = "calendar"
+MATERIAL = "material"
+
+# Blackboard course names and the files named after them:
+# "Lenguaje II - 120006 - D (2025-00-PRE)"
+_COURSE_LABEL_RE = re.compile(
+    r"^(?P<course>.+?)\s+-\s+(?P<code>\d{5,6})\s+-\s+[^\s(]+\s*\((?P<term>20\d{2}-\d{2})"
+)
+_CODE_RE = re.compile(r"c[oó]digo(?: del curso)?\s*:\s*(\d{5,6})", re.IGNORECASE)
+_HEADER_TERM_RE = re.compile(
+    r"(?:periodo|per[ií]odo|semestre|ciclo)\s+acad[eé]mico\s*:\s*(20\d{2}-\d{2})", re.IGNORECASE
+)
+_TERM_RE = re.compile(r"(?<!\d)(20\d{2})[-_](0[0-2])(?!\d)")
+
+
+def parse_course_label(label: str) -> dict:
+    """{course, course_code, term} from a "Name - code - section (term)" label, or {}"""
+    match = _COURSE_LABEL_RE.match((label or "").strip())
+    if not match:
+        return {}
+    return {"course": match.group("course").strip(), "course_code": match.group("code"),
+            "term": match.group("term")}
+
+
+def _document_type(filename: str, header: str) -> str:
+    name = course_key(filename.replace("_", " ").replace("-", " "))
+    opening = course_key(header[:300])
+    if "silabo" in name or "syllabus" in name or "silabo" in opening:
+        return SYLLABUS
+    if "reglamento" in name or "reglamento" in opening:
+        return REGULATION
+    if "calendario" in name or "calendario" in opening:
+        return CALENDAR
+    if detect_course(header):
+        return SYLLABUS
+    return MATERIAL
+
+
+def _term(label: dict, filename: str, header: str) -> str:
+    if label.get("term"):
+        return label["term"]
+    match = _HEADER_TERM_RE.search(header)
+    if match:
+        return match.group(1)
+    match = _TERM_RE.search(filename)
+    return f"{match.group(1)}-{match.group(2)}" if match else ""
+
+
+def tag_document(filename: str, header: str = "", course_hint: str = None) -> dict:
+    """Retrieval tags for a document.
+
+    Args:
+        filename: PDF file name
+        header: Text of the first pages
+        course_hint: Blackboard course name the file was downloaded from
+
+    Returns:
+        Dict with every TAG_KEYS key
+    """
+    doc_type = _document_type(filename, header)
+    term = _term(parse_course_label(Path(filename).stem), filename, header)
+    if doc_type in (REGULATION, CALENDAR):
+        # Institutional documents apply to every course
+        return {"doc_type": doc_type, "course": "", "course_code": "", "course_key": "", "term": term}
+
+    label = parse_course_label(Path(filename).stem) or parse_course_label(course_hint)
+    course = detect_course(header) or label.get("course") or (course_hint or "").strip()
+    code = _CODE_RE.search(header)
+    return {
+        "doc_type": doc_type,
+        "course": course,
+        "course_code": code.group(1) if code else label.get("course_code", ""),
+        "course_key": course_key(course) if course else "",
+        "term": term or label.get("term", "")
+    }
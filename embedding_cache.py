@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+
+try:
+    from openai import RateLimitError
+except ImportError:  # pragma: no cover - openai ships with langchain-openai
+    RateLimitError = None
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    if RateLimitError is not None and isinstance(error, RateLimitError):
+        return True
+    return getattr(error, "status_code", None) == 429
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query so trivially different spellings share a key"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """LRU of normalized query text to embedding vector.
+
+    Lives in process memory, optionally backed by a SQLite file so several
+    processes (and restarts) share what was already embedded. The file keeps
+    at most ``max_persisted`` rows, evicting the least recently used.
+    """
+
+    def __init__(self, max_size: int = 1024, path=None, max_persisted: int = 20000):
+        self.max_size = max_size
+        self.max_persisted = max_persisted
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS queries "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS queries_last_used ON queries (last_used)")
+                self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT vector FROM queries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._conn.execute("UPDATE queries SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: list[float]):
+        with self._lock:
+            self._remember(key, vector)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (key, vector, last_used) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), time.time())
+            )
+            self._writes += 1
+            # Trimming needs a count, so only do it every so often
+            if self._writes % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM queries WHERE key IN (SELECT key FROM queries "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_persisted,)
+                )
+            self._conn.commit()
+
+    def _remember(self, key: str, vector: list[float]):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an on-disk cache and batched, concurrent calls.
+
+    Vectors are stored in SQLite keyed by a hash of the model name and the
+    chunk text, so boilerplate repeated across syllabi is embedded once.
+    Misses are deduplicated, split into batches of ``batch_size`` and sent
+    with up to ``max_concurrency`` requests in flight. Rate-limit errors are
+    retried with exponential backoff. Queries go through an optional
+    QueryEmbeddingCache instead, since they are short-lived and repetitive.
+    """
+
+    def __init__(self, embedder: Embeddings, cache_path, model_name: str = None,
+                 batch_size: int = 64, max_concurrency: int = 4,
+                 max_retries: int = 6, backoff_seconds: float = 1.0,
+                 query_cache: QueryEmbeddingCache = None):
+        self.embedder = embedder
+        self.query_cache = query_cache
+        self.model_name = model_name or getattr(embedder, "model", None) or type(embedder).__name__
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self.cache_path = Path(cache_path)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, items: dict):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def _embed_with_retry(self, texts: list) -> list:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embedder.embed_documents(texts)
+            except Exception as e:
+                if not _is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Embedding rate limited, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(list(set(keys)))
+
+        # Each distinct missing text is embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [
+                missing_keys[start:start + self.batch_size]
+                for start in range(0, len(missing_keys), self.batch_size)
+            ]
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = pool.map(
+                    lambda batch: self._embed_with_retry([missing[key] for key in batch]),
+                    batches
+                )
+                computed = {}
+                for batch, batch_vectors in zip(batches, results):
+                    computed.update(zip(batch, batch_vectors))
+            self._store(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return self.embedder.embed_query(text)
+        key = self._key(normalize_query(text))
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.embedder.embed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return await self.embedder.aembed_query(text)
+        key = self._key(normalize_query(text))
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = await self.embedder.aembed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
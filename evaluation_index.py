@@ -0,0 +1,135 @@
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from date_extraction import extract_evaluations, infer_week_one, infer_year
+
+logger = logging.getLogger(__name__)
+
+_COURSE_RE = re.compile(r'nombre del curso\s*:\s*([^\n]+)', re.IGNORECASE)
+
+
+def course_key(name: str) -> str:
+    """Lookup key for a course name: accent-folded, lowercase, single-spaced"""
+    name = unicodedata.normalize("NFKD", name.lower())
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def detect_course(text: str):
+    """Course name from a syllabus header ("Nombre del curso: ..."), or None"""
+    match = _COURSE_RE.search(text)
+    return match.group(1).strip() if match else None
+
+
+def extract_document_evaluations(pages, source: str) -> tuple:
+    """Detect a syllabus' course and extract its evaluations.
+
+    Returns:
+        Tuple of (course name or None, evaluations). Documents without a
+        syllabus header yield no evaluations.
+    """
+    pages = sorted(pages)
+    header = "\n".join(text for _, text in pages[:2])
+    course = detect_course(header)
+    if not course:
+        return None, []
+    return course, extract_evaluations(
+        pages, course, source,
+        default_year=infer_year(header),
+        week_one=infer_week_one("\n".join(text for _, text in pages))
+    )
+
+
+class EvaluationIndex:
+    """SQLite table of evaluation rows extracted from syllabi at ingestion.
+
+    Scheduling requests become an indexed lookup by course instead of a
+    similarity search plus regex scan per request.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS documents (
+                    source TEXT PRIMARY KEY,
+                    course TEXT,
+                    course_key TEXT
+                );
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    id INTEGER PRIMARY KEY,
+                    course TEXT NOT NULL,
+                    course_key TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    weight INTEGER,
+                    modality TEXT,
+                    source TEXT NOT NULL,
+                    page INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS evaluations_course ON evaluations (course_key, date);
+                CREATE INDEX IF NOT EXISTS evaluations_source ON evaluations (source);
+            """)
+
+    def replace_source(self, source: str, course, evaluations: list[dict]):
+        """Store the evaluations of one document, replacing earlier rows"""
+        key = course_key(course) if course else None
+        with self._lock:
+            self._conn.execute("DELETE FROM evaluations WHERE source = ?", (source,))
+            self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (source, course, key))
+            self._conn.executemany(
+                "INSERT INTO evaluations (course, course_key, type, date, weight, modality, source, page) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (course, key, e['type'], e['date'].isoformat(), e['weight'],
+                     e['modality'], source, e['page'])
+                    for e in evaluations
+                ]
+            )
+            self._conn.commit()
+
+    def remove_source(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM evaluations WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def sources(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT source FROM documents")}
+
+    def lookup(self, course_name: str) -> list[dict]:
+        """Evaluations of a course by name, ordered by date"""
+        key = course_key(course_name)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT course, type, date, weight, modality, source, page FROM evaluations "
+                "WHERE course_key = ? ORDER BY date", (key,)
+            ).fetchall()
+            if not rows:
+                # Partial names ("economía general") fall back to a scan of the small table
+                rows = self._conn.execute(
+                    "SELECT course, type, date, weight, modality, source, page FROM evaluations "
+                    "WHERE instr(course_key, ?) > 0 ORDER BY date", (key,)
+                ).fetchall()
+
+        return [
+            {
+                'course': course,
+                'type': eval_type,
+                'date': datetime.fromisoformat(date),
+                'weight': weight,
+                'modality': modality,
+                'source': source,
+                'page': page
+            }
+            for course, eval_type, date, weight, modality, source, page in rows
+        ]
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from document_tags import TAG_KEYS, tag_document
+from evaluation_index import extract_document_evaluations
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Hash a file's content without loading it fully into memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(file_name: str, digest: str, index: int) -> str:
+    """Stable vector store ID for a chunk of a given file version"""
+    file_key = hashlib.sha1(f"{file_name}:{digest}".encode("utf-8")).hexdigest()[:16]
+    return f"{file_key}-{index}"
+
+
+class IngestionManifest:
+    """Record of the PDFs already indexed in the vector store.
+
+    Entries are keyed by file name and store the content hash, mtime and
+    size seen at indexing time. mtime and size are a cheap first check; the
+    hash is only computed when they differ, so touched-but-identical files
+    are not re-embedded.
+    """
+
+    def __init__(self, persist_directory):
+        self.path = Path(persist_directory) / MANIFEST_FILENAME
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ingestion manifest {self.path}: {e}")
+            return {}
+
+    def save(self):
+        """Write the manifest atomically next to the Chroma store"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, pdf_files) -> tuple[list[tuple[Path, str]], list[str]]:
+        """Compare the files on disk against the manifest.
+
+        Returns:
+            Tuple of (files to index as (path, content hash) pairs,
+            names whose existing chunks must be removed). A replaced file
+            appears in both lists.
+        """
+        changed = []
+        removed = []
+        present = set()
+
+        for path in pdf_files:
+            present.add(path.name)
+            stat = path.stat()
+            entry = self.entries.get(path.name)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+
+            digest = file_sha256(path)
+            if entry and entry["hash"] == digest:
+                # Same content, only the timestamp moved
+                entry["mtime"] = stat.st_mtime
+                continue
+
+            if entry:
+                removed.append(path.name)
+            changed.append((path, digest))
+
+        removed.extend(name for name in self.entries if name not in present)
+        return changed, removed
+
+    def record(self, path: Path, digest: str, chunk_count: int, tags: dict = None):
+        stat = path.stat()
+        self.entries[path.name] = {
+            "hash": digest,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunks": chunk_count,
+            "tags": tags or {},
+        }
+
+    def tags(self) -> dict:
+        """{file name: retrieval tags} of the indexed files that have them"""
+        return {name: entry["tags"] for name, entry in self.entries.items() if entry.get("tags")}
+
+    def forget(self, name: str):
+        self.entries.pop(name, None)
+
+
+def parse_pdf(path: str, digest: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+              course_hint: str = None) -> tuple:
+    """Extract and chunk a single PDF.
+
+    Module-level so it can run inside a worker process; only the file path
+    goes in and picklable results come back out. Every chunk is tagged with
+    the document's type, course and term (see document_tags), using
+    course_hint, the Blackboard course of the file, when known.
+
+    Returns:
+        Tuple of (chunks, (course, evaluations)); evaluations are extracted
+        from the full text of syllabi
+    """
+    pdf_path = Path(path)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False,
+        # Offsets let the context builder merge overlapping chunks
+        add_start_index=True
+    )
+    documents = PyPDFLoader(str(pdf_path)).load()
+    chunks = text_splitter.split_documents(documents)
+    schedule = extract_document_evaluations(
+        [(doc.metadata.get("page", 0), doc.page_content) for doc in documents], pdf_path.name
+    )
+
+    tags = tag_document(
+        pdf_path.name, "\n".join(doc.page_content for doc in documents[:2]), course_hint
+    )
+
+    processed_date = str(pdf_path.stat().st_mtime)
+    for i, chunk in enumerate(chunks):
+        chunk.metadata.update(tags)
+        chunk.metadata.update({
+            "source": pdf_path.name,
+            "file_path": str(pdf_path),
+            "file_hash": digest,
+            "chunk_id": chunk_id(pdf_path.name, digest, i),
+            "chunk_size": len(chunk.page_content),
+            "processed_date": processed_date
+        })
+    return chunks, schedule
+
+
+class IngestionPipeline:
+    """Two-stage PDF ingestion.
+
+    Text extraction and chunking are CPU-bound and run in a process pool.
+    Parsed files are handed over through a bounded queue to a single thread
+    that embeds and upserts them into the vector store, so parsing never
+    runs more than ``queue_size`` files ahead of embedding. The same thread
+    keeps the optional lexical and evaluation indexes in step with the
+    vector store.
+    """
+
+    _DONE = object()
+
+    def __init__(self, vector_store, workers: int = None, queue_size: int = 8,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, lexical_index=None,
+                 evaluation_index=None, course_hints: dict = None):
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.evaluation_index = evaluation_index
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_size = max(1, queue_size)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # {file name: Blackboard course name} for downloaded files
+        self.course_hints = course_hints or {}
+
+    def run(self, pdf_files, manifest) -> int:
+        """Index (path, content hash) pairs and record them in the manifest.
+
+        Returns:
+            Number of chunks added
+        """
+        handoff = queue.Queue(maxsize=self.queue_size)
+        added = [0]
+        consumer = threading.Thread(
+            target=self._upsert_stage, args=(handoff, manifest, added),
+            name="ingestion-upsert", daemon=True
+        )
+        consumer.start()
+        try:
+            if self.workers == 1 or len(pdf_files) == 1:
+                self._parse_inline(pdf_files, handoff)
+            else:
+                self._parse_parallel(pdf_files, handoff)
+        finally:
+            handoff.put(self._DONE)
+            consumer.join()
+        return added[0]
+
+    def _parse_inline(self, pdf_files, handoff):
+        for pdf_path, digest in pdf_files:
+            try:
+                parsed = parse_pdf(str(pdf_path), digest, self.chunk_size, self.chunk_overlap,
+                                   self.course_hints.get(pdf_path.name))
+            except Exception as e:
+                logger.error(f"Error processing {pdf_path.name}: {e}")
+                continue
+            handoff.put((pdf_path, digest, parsed))
+
+    def _parse_parallel(self, pdf_files, handoff):
+        # spawn avoids forking a parent that already runs Chroma/Streamlit threads
+        context = multiprocessing.get_context("spawn")
+        pending = iter(pdf_files)
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            def submit_next():
+                for pdf_path, digest in pending:
+                    future = pool.submit(
+                        parse_pdf, str(pdf_path), digest, self.chunk_size, self.chunk_overlap,
+                        self.course_hints.get(pdf_path.name)
+                    )
+                    in_flight[future] = (pdf_path, digest)
+                    return
+
+            # Keep every worker busy plus one file each in reserve
+            for _ in range(self.workers * 2):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pdf_path, digest = in_flight.pop(future)
+                    try:
+                        parsed = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing {pdf_path.name}: {e}")
+                    else:
+                        # Blocks while the upsert stage is queue_size files behind
+                        handoff.put((pdf_path, digest, parsed))
+                    submit_next()
+
+    def _upsert_stage(self, handoff, manifest, added):
+        while True:
+            item = handoff.get()
+            if item is self._DONE:
+                return
+            pdf_path, digest, (chunks, (course, evaluations)) = item
+            try:
+                if chunks:
+                    self.vector_store.add_documents(
+                        chunks, ids=[chunk.metadata["chunk_id"] for chunk in chunks]
+                    )
+                    if self.lexical_index is not None:
+                        self.lexical_index.add(chunks)
+                if self.evaluation_index is not None:
+                    self.evaluation_index.replace_source(pdf_path.name, course, evaluations)
+                tags = {key: chunks[0].metadata[key] for key in TAG_KEYS} if chunks else None
+                manifest.record(pdf_path, digest, len(chunks), tags)
+                added[0] += len(chunks)
+                logger.info(f"Added {len(chunks)} chunks from {pdf_path.name}")
+            except Exception as e:
+                logger.error(f"Error indexing {pdf_path.name}: {e}")
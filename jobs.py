@@ -0,0 +1,188 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job once cancellation has been requested.
+
+    Like asyncio.CancelledError it is not an Exception, so the broad
+    ``except Exception`` fallbacks inside the scraper do not swallow it.
+    """
+
+
+class Job:
+    """Handle passed to a running job to report progress and see cancellation"""
+
+    def __init__(self, runner, job_id: str):
+        self.id = job_id
+        self._runner = runner
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check(self):
+        """Stop the job here if it was cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def progress(self, fraction: float, message: str = None):
+        """Record progress (0..1); also a cancellation point"""
+        self._runner._update(self.id, progress=max(0.0, min(1.0, fraction)), message=message)
+        self.check()
+
+
+class JobRunner:
+    """Thread pool running long tasks with their state in a SQLite table.
+
+    The UI submits work and polls it instead of blocking a script run, so a
+    rerun or a second browser tab sees the same job. Only one active job per
+    (kind, owner) is allowed; submitting again returns the active one,
+    unless the job must see work that arrived after a running one started
+    (see submit's rerun_if_running).
+    Jobs left active by a previous process are marked failed on start.
+    """
+
+    def __init__(self, path, max_workers: int = 2):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (kind, owner, created);
+            """)
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Interrumpido', updated = ? "
+                "WHERE status IN (?, ?)", (FAILED, time.time(), *ACTIVE)
+            )
+            self._conn.commit()
+
+    def submit(self, kind: str, owner: str, function, *args, rerun_if_running: bool = False,
+               **kwargs) -> str:
+        """Run function(job, *args, **kwargs) in the background.
+
+        Args:
+            kind: Job type, e.g. "blackboard_sync"
+            owner: Who the job belongs to; one active job per kind and owner
+            function: Callable taking a Job first; its return value must be
+                JSON serializable and is stored as the result
+            rerun_if_running: Only deduplicate into a queued job; if one is
+                already running, submit another, since the running one may
+                have read its input before this submission
+
+        Returns:
+            ID of the new job, or of the active job it was deduplicated into
+        """
+        statuses = (QUEUED,) if rerun_if_running else ACTIVE
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT id FROM jobs WHERE kind = ? AND owner = ? "
+                f"AND status IN ({','.join('?' * len(statuses))})",
+                (kind, owner, *statuses)
+            ).fetchone()
+            if row:
+                return row[0]
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, QUEUED, now, now)
+            )
+            self._conn.commit()
+            job = Job(self, job_id)
+            self._jobs[job_id] = job
+
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job_id
+
+    def _run(self, job: Job, function, args, kwargs):
+        try:
+            job.check()
+            self._update(job.id, status=RUNNING)
+            result = function(job, *args, **kwargs)
+            self._update(job.id, status=DONE, progress=1.0, result=json.dumps(result, default=str))
+        except JobCancelled:
+            self._update(job.id, status=CANCELLED)
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            self._update(job.id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def _update(self, job_id: str, **fields):
+        fields = {key: value for key, value in fields.items() if value is not None}
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask an active job to stop at its next cancellation point"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job._cancel.set()
+        return True
+
+    def get(self, job_id: str):
+        """Job as a dict (result decoded), or None"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def latest(self, kind: str, owner: str):
+        """Most recent job of a kind for an owner, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND owner = ? ORDER BY created DESC LIMIT 1",
+                (kind, owner)
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job._cancel.set()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,198 @@
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_FIELD_RE = re.compile(r"^\w+$")
+
+SPANISH_STOPWORDS = frozenset("""
+a al algo como con cual cuando de del desde donde e el ella ellas ellos en entre es esa ese eso
+esta este esto fue ha han hay la las le les lo los mas me mi muy no nos o para pero por que
+se segun ser si sin sobre son su sus tambien te tu un una uno unos unas y ya
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, strip accents and split into index terms.
+
+    Numbers are kept as terms so course codes ("120006") and article
+    numbers match exactly.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in _TOKEN_RE.findall(text) if token not in SPANISH_STOPWORDS]
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 60) -> list[Document]:
+    """Merge ranked Document lists by reciprocal rank, deduplicating by chunk_id"""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.metadata.get("chunk_id") or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def where_sql(where: dict) -> tuple[str, list]:
+    """SQL condition on the chunks' metadata for a Chroma-style where filter.
+
+    Supports {field: value}, {field: {"$in": [...]}} and "$and" of those.
+    """
+    if not where:
+        return "1", []
+    if "$and" in where:
+        parts = [where_sql(clause) for clause in where["$and"]]
+        return " AND ".join(f"({sql})" for sql, _ in parts), [p for _, params in parts for p in params]
+    conditions, params = [], []
+    for field, condition in where.items():
+        if not _FIELD_RE.match(field):
+            raise ValueError(f"Invalid metadata field: {field}")
+        column = f"json_extract(c.metadata, '$.{field}')"
+        if isinstance(condition, dict) and "$in" in condition:
+            values = list(condition["$in"])
+            conditions.append(f"{column} IN ({','.join('?' * len(values))})" if values else "0")
+            params.extend(values)
+        elif isinstance(condition, dict) and "$eq" in condition:
+            conditions.append(f"{column} = ?")
+            params.append(condition["$eq"])
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(condition)
+    return " AND ".join(conditions), params
+
+
+class LexicalIndex:
+    """BM25 inverted index over the same chunks stored in Chroma.
+
+    Postings live in SQLite next to the Chroma store, so the index is
+    persisted and updated per source file as PDFs are indexed or removed.
+    """
+
+    def __init__(self, path, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._stats = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+                CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+                CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            """)
+
+    def add(self, chunks: list[Document]):
+        """Index chunks; each needs chunk_id and source metadata"""
+        chunk_rows = []
+        posting_rows = []
+        for chunk in chunks:
+            chunk_id = chunk.metadata["chunk_id"]
+            terms = Counter(tokenize(chunk.page_content))
+            chunk_rows.append((
+                chunk_id,
+                chunk.metadata["source"],
+                sum(terms.values()),
+                chunk.page_content,
+                json.dumps(chunk.metadata, ensure_ascii=False)
+            ))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in terms.items())
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE chunk_id = ?",
+                                   [(row[0],) for row in chunk_rows])
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", chunk_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+            self._stats = None
+
+    def remove_source(self, source: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE source = ?)",
+                (source,)
+            )
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.commit()
+            self._stats = None
+
+    def sources(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT source FROM chunks")}
+
+    def search(self, query: str, k: int = 4, where: dict = None) -> list[Document]:
+        """Return the k best BM25 matches as Documents.
+
+        where restricts the search to chunks whose metadata matches, as a
+        Chroma-style filter (see where_sql).
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        condition, condition_params = where_sql(where)
+
+        with self._lock:
+            if self._stats is None:
+                count, avg_length = self._conn.execute(
+                    "SELECT COUNT(*), AVG(length) FROM chunks"
+                ).fetchone()
+                self._stats = (count, avg_length or 1.0)
+            total, avg_length = self._stats
+            if not total:
+                return []
+
+            scores = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p "
+                    f"JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ? AND {condition}",
+                    (term, *condition_params)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            if not best:
+                return []
+            placeholders = ",".join("?" * len(best))
+            rows = {
+                chunk_id: (text, metadata)
+                for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({placeholders})",
+                    best
+                )
+            }
+
+        return [
+            Document(page_content=rows[chunk_id][0], metadata=json.loads(rows[chunk_id][1]))
+            for chunk_id in best if chunk_id in rows
+        ]
@@ -0,0 +1,91 @@
+"""Deterministic local stand-ins for the OpenAI models.
+
+They make ingestion, caching and retrieval runnable without an API key or
+network access, with stable outputs from run to run.
+"""
+import hashlib
+import math
+import re
+import time
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words feature hashing embedder.
+
+    Texts sharing words get similar vectors, which is enough for retrieval
+    to behave plausibly. Call counters allow checking how much work reached
+    the embedder.
+    """
+
+    def __init__(self, size: int = 256, model: str = "local-hash"):
+        self.size = size
+        self.model = model
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.size
+        for token in _TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        self.texts_embedded += 1
+        return self._embed(text)
+
+
+class ExtractiveChatModel(BaseChatModel):
+    """Chat model that answers with the first words of the last message.
+
+    Answers depend only on the prompt, so runs are reproducible, and usage
+    metadata counts words as tokens. ``latency`` adds a fixed delay per
+    call to stand in for the remote model.
+    """
+
+    max_words: int = 60
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-extractive"
+
+    def _answer(self, messages) -> tuple[list[str], dict]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        words = _TOKEN_RE.findall(str(messages[-1].content))[:self.max_words]
+        prompt_tokens = sum(len(_TOKEN_RE.findall(str(message.content))) for message in messages)
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words)
+        }
+        return words, usage
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        words, usage = self._answer(messages)
+        message = AIMessage(content=" ".join(words), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        words, usage = self._answer(messages)
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
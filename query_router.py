@@ -0,0 +1,66 @@
+import re
+import threading
+from document_tags import CALENDAR, REGULATION, SYLLABUS
+from evaluation_index import course_key
+
+# Questions about university-wide rules and dates, answered by the
+# regulations and the academic calendar rather than by course files
+_INSTITUTIONAL_RE = re.compile(
+    r"\b(reglamento|calendario|matricula|retir(o|arme|arse)|feriado|vacaciones|inicio de clases"
+    r"|empiezan las clases|creditos|desaprob\w*|promedio ponderado|nota minima|sustitutori\w*"
+    r"|inasistencias?|faltas?|ciclo 20\d\d)\b"
+)
+_SYLLABUS_RE = re.compile(r"\b(silabos?|syllabus)\b")
+_CODE_RE = re.compile(r"\b\d{6}\b")
+
+
+class QueryRouter:
+    """Pick the slice of the index a question should search.
+
+    A question naming a known course (by name or code) is limited to that
+    course's documents, one about university-wide rules or dates to the
+    regulations and calendar, and an explicit request for a syllabus to
+    syllabi. Anything else searches everything. Routes are Chroma ``where``
+    filters, which LexicalIndex.search understands as well.
+    """
+
+    def __init__(self):
+        self._courses = {}
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def update(self, tags_by_source: dict):
+        """Rebuild the course catalog from {source: tags} of the indexed files"""
+        courses, codes = {}, {}
+        for tags in tags_by_source.values():
+            key = tags.get("course_key")
+            if not key:
+                continue
+            courses[key] = re.compile(rf"\b{re.escape(key)}\b")
+            if tags.get("course_code"):
+                codes[tags["course_code"]] = key
+        with self._lock:
+            self._courses, self._codes = courses, codes
+
+    def course(self, question: str):
+        """course_key of the course a question names, or None"""
+        folded = course_key(question)
+        with self._lock:
+            for code in _CODE_RE.findall(folded):
+                if code in self._codes:
+                    return self._codes[code]
+            # "Economía General II" wins over "Economía General I"
+            matches = [key for key, pattern in self._courses.items() if pattern.search(folded)]
+        return max(matches, key=len) if matches else None
+
+    def route(self, question: str):
+        """Chroma where filter for a question, or None to search everything"""
+        key = self.course(question)
+        if key:
+            return {"course_key": key}
+        folded = course_key(question)
+        if _SYLLABUS_RE.search(folded):
+            return {"doc_type": SYLLABUS}
+        if _INSTITUTIONAL_RE.search(folded):
+            return {"doc_type": {"$in": [REGULATION, CALENDAR]}}
+        return None
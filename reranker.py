@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import math
+import threading
+from collections import Counter, OrderedDict
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Multilingual MiniLM trained on mMARCO; small enough for CPU inference
+DEFAULT_RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class LexicalScorer:
+    """Query-chunk relevance from term overlap, with no model to load.
+
+    Scores a pair by BM25 over the candidate set itself, plus a bonus for
+    the share of query terms covered and for query bigrams found in order.
+    Used when sentence-transformers is not installed.
+    """
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, coverage_weight: float = 1.0,
+                 bigram_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.coverage_weight = coverage_weight
+        self.bigram_weight = bigram_weight
+
+    def score(self, query: str, texts: list[str]) -> list[float]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not texts:
+            return [0.0] * len(texts)
+        documents = [tokenize(text) for text in texts]
+        average_length = sum(len(tokens) for tokens in documents) / len(documents) or 1.0
+        frequencies = Counter(term for tokens in documents for term in set(tokens))
+        query_bigrams = set(zip(terms, terms[1:]))
+
+        scores = []
+        for tokens in documents:
+            counts = Counter(tokens)
+            norm = self.k1 * (1 - self.b + self.b * len(tokens) / average_length)
+            bm25 = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    idf = math.log(1 + (len(documents) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+                    bm25 += idf * tf * (self.k1 + 1) / (tf + norm)
+            coverage = sum(1 for term in terms if term in counts) / len(terms)
+            bigrams = len(query_bigrams & set(zip(tokens, tokens[1:])))
+            scores.append(bm25 + self.coverage_weight * coverage + self.bigram_weight * bigrams)
+        return scores
+
+
+class CrossEncoderScorer:
+    """sentence-transformers cross-encoder run on the CPU"""
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+        self.name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def score(self, query: str, texts: list[str], batch_size: int = 16) -> list[float]:
+        if not texts:
+            return []
+        scores = self.model.predict([(query, text) for text in texts], batch_size=batch_size,
+                                    show_progress_bar=False)
+        return [float(score) for score in scores]
+
+
+def load_scorer(model_name: str = DEFAULT_RERANKER_MODEL):
+    """The cross-encoder if sentence-transformers is available, else LexicalScorer"""
+    if model_name:
+        try:
+            return CrossEncoderScorer(model_name)
+        except ImportError:
+            logger.info("sentence-transformers not installed, reranking with the lexical scorer")
+        except Exception as e:
+            logger.warning(f"Could not load reranker model {model_name}, using the lexical scorer: {e}")
+    return LexicalScorer()
+
+
+class Reranker:
+    """Reorder retrieved chunks by a query-chunk relevance score.
+
+    Candidates are scored in batches and each (query, chunk) score is kept
+    in an LRU cache, so a repeated or retried question only scores chunks
+    it has not seen. The scorer is loaded on first use; pass one to
+    override the default cross-encoder / lexical fallback.
+    """
+
+    def __init__(self, scorer=None, model_name: str = DEFAULT_RERANKER_MODEL,
+                 batch_size: int = 16, cache_size: int = 4096):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._scorer = scorer
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def scorer(self):
+        if self._scorer is None:
+            with self._load_lock:
+                if self._scorer is None:
+                    self._scorer = load_scorer(self.model_name)
+                    logger.info(f"Reranking with {self._scorer.name}")
+        return self._scorer
+
+    @staticmethod
+    def _key(query: str, doc) -> tuple:
+        chunk = doc.metadata.get("chunk_id") or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+        return query.strip(), chunk
+
+    def score(self, query: str, docs: list) -> list[float]:
+        """Relevance score of each doc for the query"""
+        keys = [self._key(query, doc) for doc in docs]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+            self.hits += len(scores)
+
+        missing = [(key, doc) for key, doc in zip(keys, docs) if key not in scores]
+        missing = list({key: doc for key, doc in missing}.items())
+        if missing and isinstance(self.scorer, LexicalScorer):
+            # BM25 statistics come from the whole candidate set, scored in one pass
+            fresh = dict(zip(keys, self.scorer.score(query, [doc.page_content for doc in docs])))
+            scores.update((key, fresh[key]) for key, _ in missing)
+        elif missing:
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                batch_scores = self.scorer.score(query, [doc.page_content for _, doc in batch],
+                                                 batch_size=self.batch_size)
+                scores.update(zip((key for key, _ in batch), batch_scores))
+
+        with self._lock:
+            self.misses += len(missing)
+            for key, _ in missing:
+                self._scores[key] = scores[key]
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, docs: list, top_n: int = 3) -> list:
+        """The top_n docs by score; ties keep their retrieval order"""
+        scores = self.score(query, docs)
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        return [docs[i] for i in order[:top_n]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._scores),
+            }
@@ -0,0 +1,109 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def cosine_similarity(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticResponseCache:
+    """LRU cache of answers for semantically repeated questions.
+
+    An entry is reused when the new question retrieved exactly the same
+    chunks and its embedding is at least ``similarity_threshold`` similar to
+    the cached question. Entries expire after ``ttl_seconds`` and are dropped
+    as soon as one of their source PDFs is re-indexed. The key holds no
+    conversation history, so callers must only look up and store answers
+    to prompts sent without history (UPAgent does so for the first
+    question of a conversation); the cache is shared by every session.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600,
+                 max_entries: int = 512):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    def lookup(self, query_vector, chunk_ids) -> str:
+        """Return a cached answer, or None on a miss"""
+        key = frozenset(chunk_ids)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry["created"] > self.ttl_seconds:
+                    del self._entries[entry_id]
+                    continue
+                if entry["chunk_ids"] != key:
+                    continue
+                score = cosine_similarity(query_vector, entry["vector"])
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            self.saved_tokens += entry["tokens"]
+            return entry["answer"]
+
+    def store(self, query_vector, chunk_ids, sources, answer: str,
+              latency: float = 0.0, tokens: int = 0):
+        """Cache an answer along with what it cost to generate"""
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": list(query_vector),
+                "chunk_ids": frozenset(chunk_ids),
+                "sources": frozenset(sources),
+                "answer": answer,
+                "latency": latency,
+                "tokens": tokens,
+                "created": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_sources(self, sources) -> int:
+        """Drop every entry built from any of the given source files"""
+        sources = set(sources)
+        if not sources:
+            return 0
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if entry["sources"] & sources]
+            for entry_id in stale:
+                del self._entries[entry_id]
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached responses")
+        return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "saved_tokens": self.saved_tokens,
+            }
@@ -0,0 +1,238 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans range from sub-millisecond index lookups to LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("upagent_trace", default=None)
+_current_span = contextvars.ContextVar("upagent_span", default=None)
+
+
+def _reset(variable: contextvars.ContextVar, token):
+    try:
+        variable.reset(token)
+    except ValueError:
+        # A streaming generator can be closed from another context
+        pass
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+class JsonlExporter:
+    """Append finished traces to a JSON Lines file.
+
+    Spans use OpenTelemetry's field names (traceId, spanId, parentSpanId,
+    startTimeUnixNano, endTimeUnixNano, attributes) so they can be replayed
+    into an OTLP collector.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, trace: dict):
+        line = json.dumps(trace, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Telemetry:
+    """Spans, counters and histograms for the request path.
+
+    ``trace`` opens a request, ``span`` times one stage within it; every
+    span also feeds the ``upagent_stage_seconds`` histogram labelled by
+    stage. Metrics render in the Prometheus text format, served by
+    ``serve`` if wanted, and finished traces go to an optional exporter.
+    Context is kept in contextvars, so spans nest correctly across threads
+    started with a copied context and across asyncio tasks.
+    """
+
+    def __init__(self, exporter=None, buckets=DEFAULT_BUCKETS):
+        self.exporter = exporter
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._help = {}
+        self._server = None
+
+    # Recording
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def gauge(self, name: str, function, help_text: str = None):
+        """Register a callable read at export time, returning a number or {labels tuple: number}"""
+        with self._lock:
+            self._gauges[name] = function
+            if help_text:
+                self._help[name] = help_text
+
+    def describe(self, name: str, help_text: str):
+        with self._lock:
+            self._help[name] = help_text
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Root span of one request; exported once it ends"""
+        trace = {
+            "traceId": os.urandom(16).hex(),
+            "name": name,
+            "attributes": dict(attributes),
+            "spans": []
+        }
+        token = _current_trace.set(trace)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _reset(_current_trace, token)
+            if self.exporter is not None:
+                try:
+                    self.exporter.export(trace)
+                except Exception as e:
+                    logger.warning(f"Telemetry export failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a stage; attributes can be added to the yielded dict"""
+        parent = _current_span.get()
+        span = {
+            "spanId": os.urandom(8).hex(),
+            "parentSpanId": parent["spanId"] if parent else None,
+            "name": name,
+            "startTimeUnixNano": time.time_ns(),
+            "attributes": dict(attributes)
+        }
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span["attributes"]
+        except BaseException as e:
+            span["attributes"]["error"] = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _reset(_current_span, token)
+            span["endTimeUnixNano"] = span["startTimeUnixNano"] + int(elapsed * 1e9)
+            self.observe("upagent_stage_seconds", elapsed, stage=name)
+            trace = _current_trace.get()
+            if trace is not None:
+                span["traceId"] = trace["traceId"]
+                trace["spans"].append(span)
+
+    # Export
+
+    def summary(self) -> dict:
+        """{stage: {count, mean_ms}} of every span recorded so far"""
+        with self._lock:
+            return {
+                label.split('"')[1]: {"count": count, "mean_ms": total / count * 1000}
+                for (name, label), (_, total, count) in self._histograms.items()
+                if name == "upagent_stage_seconds" and count
+            }
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+            gauges = dict(self._gauges)
+            help_texts = dict(self._help)
+
+        def header(name, kind):
+            if name in help_texts:
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name in sorted({name for name, _ in counters}):
+            header(name, "counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{labels} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            header(name, "histogram")
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                inner = labels[1:-1]
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{{{inner + ',' if inner else ''}{le}}} {bucket_count}")
+                lines.append(f"{name}_bucket{{{inner + ',' if inner else ''}le=\"+Inf\"}} {count}")
+                lines.append(f"{name}_sum{labels} {total}")
+                lines.append(f"{name}_count{labels} {count}")
+
+        for name, function in sorted(gauges.items()):
+            try:
+                value = function()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+                continue
+            header(name, "gauge")
+            values = value if isinstance(value, dict) else {(): value}
+            for labels, number in values.items():
+                lines.append(f"{name}{_labels(dict(labels))} {number}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1"):
+        """Serve /metrics over HTTP from a daemon thread"""
+        if self._server is not None:
+            return self._server
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics").start()
+        logger.info(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+        return self._server
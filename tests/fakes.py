@@ -0,0 +1,256 @@
+"""Local fakes of the external services, for the tests.
+
+FakeCalendarService stands in for the Google Calendar API client and
+MockBlackboardServer serves the Blackboard Learn REST API over HTTP.
+"""
+import copy
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class _Call:
+    def __init__(self, function, *args):
+        self._function = function
+        self._args = args
+
+    def execute(self):
+        return self._function(*self._args)
+
+
+class _Batch:
+    def __init__(self, callback):
+        self._callback = callback
+        self._calls = []
+
+    def add(self, request, request_id):
+        self._calls.append((request_id, request))
+
+    def execute(self):
+        from googleapiclient.errors import HttpError
+        for request_id, request in self._calls:
+            try:
+                self._callback(request_id, request.execute(), None)
+            except HttpError as e:
+                self._callback(request_id, None, e)
+
+
+def _http_error(status: int, message: str):
+    import httplib2
+    from googleapiclient.errors import HttpError
+    return HttpError(httplib2.Response({"status": status}), message.encode("utf-8"))
+
+
+class FakeCalendarService:
+    """In-memory Calendar API covering what CalendarManager syncs with.
+
+    ``events().list`` honours pageToken and syncToken like the real API:
+    a full listing skips cancelled events, an incremental one returns every
+    change since the token, cancellations included. ``expire_sync_tokens``
+    makes old tokens fail with 410 Gone. ``list_calls`` counts requests.
+    """
+
+    def __init__(self, page_size: int = 250):
+        self.page_size = page_size
+        self.list_calls = 0
+        self._events = {}
+        self._changed = {}
+        self._sequence = 0
+        self._oldest_token = 0
+
+    def events(self):
+        return self
+
+    def new_batch_http_request(self, callback):
+        return _Batch(callback)
+
+    def insert(self, calendarId, body):
+        return _Call(self._insert, body)
+
+    def update(self, calendarId, eventId, body):
+        return _Call(self._save, dict(body, id=eventId))
+
+    def delete(self, calendarId, eventId):
+        return _Call(self._delete, eventId)
+
+    def list(self, calendarId, syncToken=None, pageToken=None, maxResults=250, **kwargs):
+        return _Call(self._list, syncToken, pageToken, maxResults)
+
+    def expire_sync_tokens(self):
+        self._oldest_token = self._sequence
+
+    def _insert(self, body):
+        existing = self._events.get(body.get("id"))
+        if existing is not None and existing["status"] != "cancelled":
+            raise _http_error(409, "The requested identifier already exists")
+        return self._save(body)
+
+    def _save(self, body):
+        self._sequence += 1
+        event = copy.deepcopy(body)
+        event.setdefault("id", f"fake{self._sequence}")
+        event.setdefault("htmlLink", f"https://calendar.local/event/{event['id']}")
+        event.setdefault("status", "confirmed")
+        self._events[event["id"]] = event
+        self._changed[event["id"]] = self._sequence
+        return copy.deepcopy(event)
+
+    def _delete(self, event_id):
+        self._sequence += 1
+        self._events[event_id] = {"id": event_id, "status": "cancelled"}
+        self._changed[event_id] = self._sequence
+
+    def _list(self, sync_token, page_token, max_results):
+        self.list_calls += 1
+        if sync_token is not None and int(sync_token) < self._oldest_token:
+            raise _http_error(410, "Sync token is no longer valid")
+
+        if sync_token is None:
+            ids = sorted(i for i, event in self._events.items() if event["status"] != "cancelled")
+        else:
+            ids = sorted(i for i, sequence in self._changed.items() if sequence > int(sync_token))
+
+        offset = int(page_token or 0)
+        size = min(max_results, self.page_size)
+        response = {"items": [copy.deepcopy(self._events[i]) for i in ids[offset:offset + size]]}
+        if offset + size < len(ids):
+            response["nextPageToken"] = str(offset + size)
+        else:
+            response["nextSyncToken"] = str(self._sequence)
+        return response
+
+
+class _BlackboardHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlsplit(self.path)
+        if mock.session_cookie and mock.session_cookie not in self.headers.get("Cookie", ""):
+            return self._send(401)
+        parts = [unquote(part) for part in url.path.split("/")]
+        if parts[:5] != ["", "learn", "api", "public", "v1"]:
+            return self._send(404)
+
+        response = mock._route(parts[5:], self.headers)
+        if response is None:
+            return self._send(404)
+        if isinstance(response, tuple):
+            return self._send(*response)
+        offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+        page = {"results": response[offset:offset + mock.page_size]}
+        if offset + mock.page_size < len(response):
+            page["paging"] = {"nextPage": f"{url.path}?offset={offset + mock.page_size}"}
+        self._send(200, json.dumps(page).encode("utf-8"), {"Content-Type": "application/json"})
+
+
+class MockBlackboardServer:
+    """Blackboard Learn REST API served from memory on a local port.
+
+    Covers the endpoints BlackboardClient uses, paged ``page_size`` results
+    at a time. Downloads carry an ETag and Last-Modified, answer a matching
+    If-None-Match with 304 and a Range request whose If-Range still matches
+    with 206. ``session_cookie`` ("name=value") makes every request without
+    it fail with 401. ``downloads`` records (file name, status, Range) per
+    download request.
+    """
+
+    last_modified = "Mon, 03 Mar 2025 12:00:00 GMT"
+
+    def __init__(self, page_size: int = 100, session_cookie: str = None):
+        self.page_size = page_size
+        self.session_cookie = session_cookie
+        self.courses = {}
+        self.downloads = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def add_file(self, course_id: str, course_name: str, content_id: str, attachment_id: str,
+                 filename: str, data: bytes, modified: str = "2025-03-03T12:00:00.000Z"):
+        course = self.courses.setdefault(course_id, {"name": course_name, "contents": {}})
+        content = course["contents"].setdefault(
+            content_id, {"title": filename, "modified": modified, "attachments": {}}
+        )
+        content["modified"] = modified
+        content["attachments"][attachment_id] = {"fileName": filename, "data": data}
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+
+    def start(self) -> str:
+        """Serve in a background thread; returns the base URL"""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _BlackboardHandler)
+        self._server.mock = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _route(self, parts: list, headers):
+        """JSON results list, a (status, body, headers) tuple or None"""
+        if parts == ["users", "me"]:
+            return 200, json.dumps({"id": "_1_1", "userName": "alumno"}).encode("utf-8")
+        if len(parts) == 3 and parts[0] == "users" and parts[2] == "courses":
+            return [{"courseId": cid, "course": {"id": cid, "name": course["name"]}}
+                    for cid, course in self.courses.items()]
+        if len(parts) < 3 or parts[0] != "courses" or parts[1] not in self.courses \
+                or parts[2] != "contents":
+            return None
+
+        contents = self.courses[parts[1]]["contents"]
+        if len(parts) == 3:
+            return [{"id": cid, "title": content["title"], "modified": content["modified"],
+                     "contentHandler": {"id": "resource/x-bb-file"}, "hasChildren": False}
+                    for cid, content in contents.items()]
+        content = contents.get(parts[3])
+        if content is None:
+            return None
+        if parts[4:] == ["attachments"]:
+            return [{"id": aid, "fileName": attachment["fileName"]}
+                    for aid, attachment in content["attachments"].items()]
+        if len(parts) == 7 and parts[4] == "attachments" and parts[6] == "download" \
+                and parts[5] in content["attachments"]:
+            return self._download(content["attachments"][parts[5]], headers)
+        return None
+
+    def _download(self, attachment: dict, headers) -> tuple:
+        data = attachment["data"]
+        etag = self.etag(data)
+        validators = {"ETag": etag, "Last-Modified": self.last_modified,
+                      "Content-Type": "application/pdf"}
+        requested = headers.get("Range")
+
+        if headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        elif requested and headers.get("If-Range") == etag:
+            start = int(re.match(r"bytes=(\d+)-", requested).group(1))
+            status, body = 206, data[start:]
+            validators["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+        else:
+            status, body = 200, data
+
+        with self._lock:
+            self.downloads.append((attachment["fileName"], status, requested))
+        return status, body, validators
@@ -0,0 +1,101 @@
+import pytest
+from blackboard_rest import BlackboardClient
+from blackboard_scraper import BlackboardScraper
+from fakes import MockBlackboardServer
+
+SYLLABUS = b"%PDF-1.4 silabo " + bytes(range(256)) * 64
+COURSE = "Lenguaje II - 120006 - D (2025-00-PRE)"
+
+
+@pytest.fixture
+def server():
+    mock = MockBlackboardServer(page_size=1, session_cookie="s_session_id=abc")
+    mock.add_file("_10_1", COURSE, "_20_1", "_30_1", "Silabo.pdf", SYLLABUS)
+    mock.add_file("_10_1", COURSE, "_20_2", "_30_2", "Cronograma.pdf", b"%PDF-1.4 cronograma")
+    mock.start()
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture
+def client(server, tmp_path):
+    client = BlackboardClient(server.url, [{"name": "s_session_id", "value": "abc"}],
+                              tmp_path / "pdfs", max_retries=0)
+    yield client
+    client.close()
+
+
+def test_download_resumes_from_partial_file(server, client):
+    partial = client.download_dir / "Silabo.pdf.part"
+    partial.write_bytes(SYLLABUS[:1000])
+
+    result = client.download("_10_1", "_20_1", {"id": "_30_1", "fileName": "Silabo.pdf"},
+                             etag=server.etag(SYLLABUS))
+
+    assert result["status"] == "resumed"
+    assert (client.download_dir / "Silabo.pdf").read_bytes() == SYLLABUS
+    assert not partial.exists()
+    assert server.downloads == [("Silabo.pdf", 206, "bytes=1000-")]
+
+
+def test_download_restarts_when_file_changed_since_partial(server, client):
+    (client.download_dir / "Silabo.pdf.part").write_bytes(b"version anterior")
+
+    result = client.download("_10_1", "_20_1", {"id": "_30_1", "fileName": "Silabo.pdf"},
+                             etag='"anterior"')
+
+    assert result["status"] == "downloaded"
+    assert (client.download_dir / "Silabo.pdf").read_bytes() == SYLLABUS
+
+
+def test_download_skips_unchanged_file_on_304(server, client):
+    attachment = {"id": "_30_1", "fileName": "Silabo.pdf"}
+    first = client.download("_10_1", "_20_1", attachment)
+    assert first["status"] == "downloaded"
+    assert first["etag"] == server.etag(SYLLABUS)
+
+    second = client.download("_10_1", "_20_1", attachment, etag=first["etag"],
+                             last_modified=first["last_modified"])
+
+    assert second["status"] == "unchanged"
+    assert (client.download_dir / "Silabo.pdf").read_bytes() == SYLLABUS
+    assert [status for _, status, _ in server.downloads] == [200, 304]
+
+
+def test_download_all_follows_paging(server, client):
+    results, complete = client.download_all()
+
+    assert sorted(result["path"].name for result in results) == ["Cronograma.pdf", "Silabo.pdf"]
+    assert {result["course"] for result in results} == {COURSE}
+    assert complete == {"_10_1"}
+
+
+@pytest.fixture
+def scraper(server, tmp_path, monkeypatch):
+    scraper = BlackboardScraper(download_dir=tmp_path / "pdfs", headless=True)
+    scraper.base_url = server.url
+    monkeypatch.setattr(scraper, "export_cookies", lambda: [{"name": "s_session_id", "value": "abc"}])
+    return scraper
+
+
+def test_sync_uses_rest_and_skips_unmodified_items(server, scraper):
+    changes = scraper.sync_course_files()
+    assert sorted(changes.added) == ["Cronograma.pdf", "Silabo.pdf"]
+
+    downloads = len(server.downloads)
+    assert scraper.sync_course_files().count == 0
+    assert len(server.downloads) == downloads
+
+
+def test_sync_falls_back_to_browser_when_rest_fails(server, scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "export_cookies", lambda: [{"name": "s_session_id", "value": "caducada"}])
+
+    def browser_download(workers=3, progress=None):
+        (scraper.download_dir / "Silabo.pdf").write_bytes(SYLLABUS)
+        return 1
+
+    monkeypatch.setattr(scraper, "download_course_files_parallel", browser_download)
+    changes = scraper.sync_course_files()
+
+    assert changes.added == ["Silabo.pdf"]
+    assert server.downloads == []
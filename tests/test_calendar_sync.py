@@ -0,0 +1,95 @@
+import datetime
+import pytest
+from calendar_manager import CalendarManager, event_id
+from fakes import FakeCalendarService
+
+LIMA = datetime.timezone(datetime.timedelta(hours=-5))
+
+
+@pytest.fixture
+def service():
+    return FakeCalendarService(page_size=3)
+
+
+@pytest.fixture
+def manager(tmp_path, service):
+    return CalendarManager(token_path=str(tmp_path / "token.json"), service=service)
+
+
+def schedule(count, day=10):
+    return [
+        {
+            "title": f"Parcial {i}",
+            "description": "Examen",
+            "start_time": datetime.datetime(2025, 5, day + i, 9, tzinfo=LIMA),
+            "key": f"curso-parcial-{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def test_add_events_upserts_with_deterministic_ids(manager, service):
+    first = manager.add_events(schedule(4))
+    assert all(success for success, _ in first)
+
+    # A re-run hits 409 on every insert and updates the same events
+    moved = schedule(4, day=20)
+    second = manager.add_events(moved)
+    assert all(success for success, _ in second)
+
+    live = {i: e for i, e in service._events.items() if e["status"] != "cancelled"}
+    assert set(live) == {event_id(f"curso-parcial-{i}") for i in range(4)}
+    assert live[event_id("curso-parcial-0")]["start"]["dateTime"].startswith("2025-05-20")
+
+
+def test_full_sync_follows_pagination(manager, service):
+    manager.add_events(schedule(7))
+
+    assert manager.sync_events() == (True, 7)
+    # 7 events over pages of 3
+    assert service.list_calls == 3
+    success, events = manager.get_events(datetime.datetime(2025, 1, 1), None)
+    assert success and len(events) == 7
+    assert manager.store.sync_token is not None
+
+
+def test_incremental_sync_only_fetches_changes(manager, service):
+    manager.add_events(schedule(5))
+    manager.sync_events()
+    token = manager.store.sync_token
+
+    service.delete("primary", event_id("curso-parcial-1")).execute()
+    service.update("primary", event_id("curso-parcial-2"),
+                   manager._event_body("Parcial movido", "", datetime.datetime(2025, 6, 1, 9, tzinfo=LIMA),
+                                       key="curso-parcial-2")).execute()
+
+    assert manager.sync_events() == (True, 2)
+    assert manager.store.sync_token != token
+    _, events = manager.get_events(datetime.datetime(2025, 1, 1), None)
+    titles = sorted(event["summary"] for event in events)
+    assert titles == ["Parcial 0", "Parcial 3", "Parcial 4", "Parcial movido"]
+
+
+def test_expired_sync_token_triggers_full_resync(manager, service):
+    manager.add_events(schedule(4))
+    manager.sync_events()
+    service.delete("primary", event_id("curso-parcial-0")).execute()
+    service.expire_sync_tokens()
+
+    calls = service.list_calls
+    assert manager.sync_events() == (True, 3)
+    # One call failing with 410, then a single page of the full listing
+    assert service.list_calls - calls == 2
+    _, events = manager.get_events(datetime.datetime(2025, 1, 1), None)
+    assert sorted(event["summary"] for event in events) == ["Parcial 1", "Parcial 2", "Parcial 3"]
+
+
+def test_get_events_keeps_max_results_positional(manager):
+    manager.add_events(schedule(6))
+    success, events = manager.get_events(datetime.datetime(2025, 1, 1), 2)
+    assert success
+    assert [event["summary"] for event in events] == ["Parcial 0", "Parcial 1"]
+
+    _, ranged = manager.get_events(datetime.datetime(2025, 1, 1), None,
+                                   end_date=datetime.datetime(2025, 5, 12, tzinfo=LIMA))
+    assert [event["summary"] for event in ranged] == ["Parcial 0", "Parcial 1"]
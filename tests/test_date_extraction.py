@@ -0,0 +1,72 @@
+from datetime import datetime
+import pytest
+from date_extraction import extract_evaluations, find_dates, infer_week_one, infer_year, parse_date
+
+
+def spans(text: str, **kwargs) -> list[tuple]:
+    return [(mention.start, mention.end) for mention in find_dates(text, **kwargs)]
+
+
+def test_week_reference_resolves_from_week_one():
+    mention, = find_dates("Examen parcial: semana 7", week_one=datetime(2025, 3, 24))
+    assert mention.week == 7
+    assert mention.start == datetime(2025, 5, 5)
+
+
+def test_week_reference_without_week_one_is_unresolved():
+    mention, = find_dates("Semana 7")
+    assert (mention.week, mention.start) == (7, None)
+
+
+def test_numeric_range():
+    assert spans("del 13/01/2025 al 18/01/2025") == [(datetime(2025, 1, 13), datetime(2025, 1, 18))]
+
+
+def test_textual_range_shares_month_and_year():
+    assert spans("del 14 al 18 de abril", default_year=2025) == [(datetime(2025, 4, 14), datetime(2025, 4, 18))]
+    assert spans("del 31/03 al viernes 4/04", default_year=2025) == [(datetime(2025, 3, 31), datetime(2025, 4, 4))]
+
+
+def test_weekday_and_textual_month():
+    mention, = find_dates("Exposición el lunes 14 de abril", default_year=2025)
+    assert mention.start == datetime(2025, 4, 14)
+    assert parse_date("25 de enero de 2025") == datetime(2025, 1, 25)
+    assert parse_date("3 de Setiembre", 2025) == datetime(2025, 9, 3)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025-01-25", datetime(2025, 1, 25)),
+    ("25/01/2025", datetime(2025, 1, 25)),
+    ("25/01/25", datetime(2025, 1, 25)),
+    ("15/01", datetime(2025, 1, 15)),
+])
+def test_iso_and_numeric_forms(text, expected):
+    assert parse_date(text, default_year=2025) == expected
+
+
+def test_invalid_dates_are_none():
+    assert spans("30/02/2025 y 31 de abril de 2025") == [(None, None), (None, None)]
+    with pytest.raises(ValueError):
+        parse_date("30/02/2025")
+
+
+def test_dates_without_year_need_a_default_year():
+    assert spans("15/01") == [(None, None)]
+    assert infer_year("Lenguaje II - 120006 - D (2025-00-PRE)") == 2025
+    assert infer_week_one("Semana 1: del 06/01/2025 al 11/01/2025") == datetime(2025, 1, 6)
+
+
+def test_evaluations_pair_type_with_nearest_date():
+    pages = [
+        (3, "Examen parcial (30%) el lunes 14 de abril, presencial.\nPráctica dirigida: 10/05."),
+        (4, "Examen final: semana 16, virtual."),
+    ]
+    evaluations = extract_evaluations(pages, "Lenguaje II", "silabo.pdf",
+                                      default_year=2025, week_one=datetime(2025, 3, 24))
+
+    assert [(e["type"], e["date"], e["page"]) for e in evaluations] == [
+        ("Examen Parcial", datetime(2025, 4, 14), 3),
+        ("Examen Final", datetime(2025, 7, 7), 4),
+    ]
+    assert [(e["weight"], e["modality"]) for e in evaluations] == [(30, "Presencial"), (None, "Virtual")]
+    assert {(e["course"], e["source"]) for e in evaluations} == {("Lenguaje II", "silabo.pdf")}
@@ -0,0 +1,154 @@
+import os
+import shutil
+from pathlib import Path
+import pytest
+from agent import AgentCore
+from embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+from ingestion import IngestionManifest, file_sha256
+from local_models import ExtractiveChatModel, HashEmbeddings
+
+PDF_DIR = Path(__file__).resolve().parent.parent / "pdfs"
+CALENDAR_PDF = "Calendario-Academico-Regular-2025-Aprobado-por-Comite-Ejecutivo-el-10-de-mayo-de-2024.pdf"
+REGULATION_PDF = "ReglamentodeEstudiosdePregrado.pdf"
+
+
+class LocalAgentCore(AgentCore):
+    """AgentCore wired to the deterministic local models"""
+
+    def _initialize_llm(self):
+        return ExtractiveChatModel()
+
+    def _initialize_embeddings(self):
+        return CachedEmbeddings(HashEmbeddings(), cache_path=self.persist_directory / "embedding_cache.sqlite",
+                                query_cache=QueryEmbeddingCache())
+
+
+def indexed(pdf_dir, *names) -> IngestionManifest:
+    manifest = IngestionManifest(pdf_dir.parent / "db")
+    for name in names:
+        path = pdf_dir / name
+        manifest.record(path, file_sha256(path), chunk_count=1)
+    return manifest
+
+
+def test_manifest_skips_touched_but_identical_file(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    (pdf_dir / "a.pdf").write_bytes(b"contenido")
+    manifest = indexed(pdf_dir, "a.pdf")
+
+    stat = (pdf_dir / "a.pdf").stat()
+    os.utime(pdf_dir / "a.pdf", (stat.st_atime, stat.st_mtime + 60))
+
+    assert manifest.diff([pdf_dir / "a.pdf"]) == ([], [])
+    assert manifest.entries["a.pdf"]["mtime"] == stat.st_mtime + 60
+
+
+def test_manifest_lists_replaced_and_removed_files(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    (pdf_dir / "a.pdf").write_bytes(b"version 1")
+    (pdf_dir / "b.pdf").write_bytes(b"borrado")
+    manifest = indexed(pdf_dir, "a.pdf", "b.pdf")
+
+    (pdf_dir / "a.pdf").write_bytes(b"version 2 con otro tamano")
+    (pdf_dir / "b.pdf").unlink()
+
+    changed, removed = manifest.diff([pdf_dir / "a.pdf"])
+    assert changed == [(pdf_dir / "a.pdf", file_sha256(pdf_dir / "a.pdf"))]
+    assert sorted(removed) == ["a.pdf", "b.pdf"]
+
+
+
+@pytest.fixture
+def core_factory(tmp_path, monkeypatch):
+    # CalendarManager keeps its event mirror next to the working directory
+    monkeypatch.chdir(tmp_path)
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for name in (CALENDAR_PDF, REGULATION_PDF):
+        shutil.copy(PDF_DIR / name, pdf_dir / name)
+
+    def factory():
+        return LocalAgentCore(None, str(pdf_dir), ingest_workers=1, persist_directory=str(tmp_path / "db"))
+    return factory, pdf_dir
+
+
+def chunk_count(core, source: str) -> int:
+    return len(core.vector_store._collection.get(where={"source": source})["ids"])
+
+
+def test_sync_deletes_chunks_of_replaced_and_removed_files(core_factory):
+    factory, pdf_dir = core_factory
+    core = factory()
+    calendar_chunks = chunk_count(core, CALENDAR_PDF)
+    assert calendar_chunks and chunk_count(core, REGULATION_PDF)
+
+    # Touched only: nothing is re-embedded
+    embedded = core.embeddings.embedder.texts_embedded
+    os.utime(pdf_dir / CALENDAR_PDF)
+    assert core.sync_documents() == ([], [])
+    assert core.embeddings.embedder.texts_embedded == embedded
+
+    # Replaced: the old chunks give way to the new content's
+    shutil.copy(pdf_dir / CALENDAR_PDF, pdf_dir / REGULATION_PDF)
+    assert core.sync_documents() == ([REGULATION_PDF], [REGULATION_PDF])
+    assert chunk_count(core, REGULATION_PDF) == calendar_chunks
+
+    # Removed: its chunks are deleted
+    (pdf_dir / REGULATION_PDF).unlink()
+    assert core.sync_documents() == ([], [REGULATION_PDF])
+    assert chunk_count(core, REGULATION_PDF) == 0
+    assert chunk_count(core, CALENDAR_PDF) == calendar_chunks
+
+def test_cached_embeddings_only_embed_new_texts(tmp_path):
+    embedder = HashEmbeddings()
+    embeddings = CachedEmbeddings(embedder, cache_path=tmp_path / "cache.sqlite", batch_size=2)
+
+    first = embeddings.embed_documents(["uno", "dos", "uno", "tres"])
+    assert embedder.texts_embedded == 3
+    assert first[0] == first[2]
+
+    assert embeddings.embed_documents(["tres", "uno", "cuatro"])[:2] == [first[3], first[0]]
+    assert embedder.texts_embedded == 4
+    assert (embeddings.hits, embeddings.misses) == (3, 4)
+
+    # The cache outlives the process
+    reopened = CachedEmbeddings(HashEmbeddings(), cache_path=tmp_path / "cache.sqlite")
+    reopened.embed_documents(["uno", "dos", "tres", "cuatro"])
+    assert reopened.embedder.texts_embedded == 0
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_query_cache_caps_persisted_rows(tmp_path):
+    cache = QueryEmbeddingCache(path=tmp_path / "queries.sqlite", max_persisted=10)
+    for i in range(100):
+        cache.put(f"q{i}", [float(i)])
+    assert cache._conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0] == 10
+
+    reopened = QueryEmbeddingCache(path=tmp_path / "queries.sqlite")
+    assert reopened.get("q99") == [99.0]
+    assert reopened.get("q0") is None
+
+
+def test_query_embeddings_share_normalized_key(tmp_path):
+    embedder = HashEmbeddings()
+    embeddings = CachedEmbeddings(embedder, cache_path=tmp_path / "cache.sqlite",
+                                  query_cache=QueryEmbeddingCache())
+
+    first = embeddings.embed_query("¿Cuándo es el  examen parcial?")
+    assert embeddings.embed_query("  ¿cuándo es el examen PARCIAL?") == first
+    assert embedder.calls == 1
+    assert embeddings.query_cache.stats()["hits"] == 1
@@ -0,0 +1,51 @@
+import logging
+from functools import lru_cache
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4-turbo-preview"
+
+# Fixed per-message framing overhead of the chat format
+_TOKENS_PER_MESSAGE = 3
+# Rough characters-per-token ratio used when no encoding can be loaded
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use; stay usable offline
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Count the tokens of a text for the given model"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text or "") // _CHARS_PER_TOKEN)
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def count_message_tokens(messages, model: str = DEFAULT_MODEL) -> int:
+    """Approximate the prompt tokens of a list of chat messages"""
+    return sum(count_tokens(message.content, model) + _TOKENS_PER_MESSAGE for message in messages)
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Cut a text down to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (text or "")[:max_tokens * _CHARS_PER_TOKEN]
+    tokens = encoding.encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text or ""
+    return encoding.decode(tokens[:max_tokens])